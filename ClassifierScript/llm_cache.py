@@ -0,0 +1,84 @@
+# #######################################################################################
+# LLMCache: LLM響應的磁盤緩存
+# #######################################################################################
+# 此模塊的主要功能:
+# 1. 以 sha256(model + payload_json) 作為確定性鍵緩存LLM響應
+# 2. 緩存命中時完全跳過HTTPS調用, 重跑/崩潰恢復時不再重複付費
+# 3. 使用每個鍵一個JSON文件的目錄存儲, 無需額外依賴
+# #######################################################################################
+
+import os
+import json
+import hashlib
+
+
+class LLMCache:
+    """
+    LLM響應的磁盤緩存
+
+    以請求內容的SHA-256哈希為鍵, 將每個響應存為緩存目錄中的
+    一個JSON文件。相同的模型與請求內容總是映射到相同的鍵,
+    因此調度器重跑或崩潰恢復時可直接命中緩存
+    """
+
+    def __init__(self, cache_dir=".llm_cache"):
+        """
+        初始化緩存
+
+        參數:
+            cache_dir: 緩存文件存放目錄, 不存在時自動創建
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, model, payload):
+        """
+        根據模型名稱和請求內容計算確定性緩存鍵
+
+        參數:
+            model: 模型名稱
+            payload: 請求內容(任意可JSON序列化的對象)
+
+        返回:
+            十六進制SHA-256字符串
+        """
+        payload_json = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256((model + payload_json).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """
+        查詢緩存
+
+        參數:
+            key: make_key計算出的緩存鍵
+
+        返回:
+            命中時返回緩存的響應, 未命中或文件損壞時返回None
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def set(self, key, response):
+        """
+        寫入緩存
+
+        參數:
+            key: make_key計算出的緩存鍵
+            response: 要緩存的響應(必須可JSON序列化)
+        """
+        path = self._path(key)
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(response, f, ensure_ascii=False)
+        except OSError:
+            # 緩存寫入失敗不影響主流程
+            pass
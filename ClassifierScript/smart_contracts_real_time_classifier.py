@@ -1,56 +1,168 @@
 import os
-import requests
+import io
+import re
 import sqlite3
 import time
 import logging
 import json
-from openai import OpenAI  # OpenAI API客戶端
+import ijson
+import asyncio
+import hashlib
+import queue
+import zstandard
+from collections import OrderedDict
+from pathlib import Path
+from logging.handlers import QueueHandler, QueueListener
+from openai import AsyncOpenAI  # OpenAI API客戶端（異步版本）
 from dotenv import load_dotenv  # 用於加載環境變量
-import logging
+from llm_cache import LLMCache
 load_dotenv()  # 加載.env文件中的環境變量
+
+# 日誌路徑相對於本文件解析，與啟動時的工作目錄無關
+LOG_PATH = Path(__file__).resolve().parent.parent / "Real_Time_System" / "Log" / "smart_contracts_classifier.log"
+LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+
+# 日誌寫盤交給後台線程，分類循環不會被磁盤IO阻塞
+_file_handler = logging.FileHandler(LOG_PATH)
+_file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+_log_queue = queue.Queue(-1)
+_log_listener = QueueListener(_log_queue, _file_handler)
+_log_listener.start()
+logging.basicConfig(
+    level=logging.INFO,
+    handlers=[QueueHandler(_log_queue)],
+)
 DB_PATH = os.getenv("DB_PATH")  # 從環境變量中獲取數據庫路徑
 OPAI_API_KEY = os.getenv("OPAI_API_KEY")  # 從環境變量中獲取OpenAI API密鑰
 DS_API_KEY = os.getenv("DS_API_KEY")
 GROK_API_KEY = os.getenv("GROK_API_KEY")
 
+# 限制同時向Grok API發送的請求數量，避免超過速率限制
+MAX_CONCURRENT_REQUESTS = 32
+
+# LLM響應的磁盤緩存，重跑時相同的請求直接命中緩存
+llm_cache = LLMCache("./.llm_cache")
+
+# 解壓爬蟲以zstd壓縮存儲的合約源碼
+_zstd_decompressor = zstandard.ZstdDecompressor()
+
+# 每個Grok請求打包的合約數量，分攤指令前導的token開銷
+BATCH_SIZE = 8
+
+# 每次從數據庫游標取出的行數，避免一次性把所有源碼讀入內存
+PAGE_SIZE = 64
+
+# 累積多少條分類結果後一次性提交，分攤每次commit的fsync開銷
+WRITE_BATCH_SIZE = 32
 
+# 自適應輪詢間隔：有新數據時快速響應，空閒時逐漸退避到上限
+MIN_POLL_INTERVAL = 1
+MAX_POLL_INTERVAL = 60
 
-def get_response(payload, url, headers):
+# 按源碼哈希記住的判定結果數量上限；詐騙代幣農場會部署成百上千份
+# 相同源碼的克隆，命中緩存即可跳過LLM調用
+VERDICT_CACHE_SIZE = 4096
+
+# 復用同一個解碼器對象，raw_decode可在任意偏移量單次解碼
+_json_decoder = json.JSONDecoder()
+
+# 單次translate刪除換行符，代替逐個replace產生的中間字符串
+_NEWLINE_STRIP = str.maketrans('', '', '\r\n')
+
+# 按Solidity頂層聲明切分源碼，用於識別重複的庫文件塊
+_CHUNK_SPLIT_RE = re.compile(
+    r'(?=^\s*(?:abstract\s+contract|contract|library|interface)\s+\w+)', re.M
+)
+_CHUNK_NAME_RE = re.compile(
+    r'^\s*(?:abstract\s+)?(contract|library|interface)\s+(\w+)', re.M
+)
+
+# 同一個塊在這麼多份合約中出現後視為庫樣板（如OpenZeppelin），不再重複發送
+_BOILERPLATE_THRESHOLD = 3
+_MIN_CHUNK_CHARS = 512
+# 塊計數同樣採用有界LRU（與_verdict_cache一致）：常駐進程會無限
+# 見到新的唯一塊，不設上限就是按哈希逐條累積的內存泄漏
+_CHUNK_COUNTS_MAX = 4096
+_chunk_counts = OrderedDict()
+
+
+def dedup_boilerplate(source_code):
     """
-    向指定URL發送POST請求並獲取響應
-    
+    將跨合約重複出現的庫/接口塊替換為一行標記
+
+    詐騙代幣普遍原樣內嵌OpenZeppelin等數十KB的標準庫；同一個塊
+    （按SHA-256識別）在多份合約中出現後即視為樣板，替換為標記以
+    節省提示token。真正自定義的邏輯不會跨合約重複，因此會被保留
+
     Args:
-        payload (dict): 請求體內容
-        url (str): 請求的URL
-        headers (dict): 請求頭
-        
+        source_code (str): 解析後的合約源碼
+
     Returns:
-        dict: API響應的JSON內容
+        str: 替換樣板塊後的源碼
     """
-    response = requests.request("POST", url, json=payload, headers=headers).json()
+    chunks = _CHUNK_SPLIT_RE.split(source_code)
+    if len(chunks) <= 1:
+        return source_code
 
-    return response
+    out = []
+    for chunk in chunks:
+        if len(chunk) < _MIN_CHUNK_CHARS:
+            out.append(chunk)
+            continue
+        digest = hashlib.sha256(chunk.strip().encode("utf-8")).hexdigest()
+        count = _chunk_counts.get(digest, 0) + 1
+        _chunk_counts[digest] = count
+        _chunk_counts.move_to_end(digest)
+        if len(_chunk_counts) > _CHUNK_COUNTS_MAX:
+            _chunk_counts.popitem(last=False)
+        if count > _BOILERPLATE_THRESHOLD:
+            name_match = _CHUNK_NAME_RE.match(chunk)
+            name = f"{name_match.group(1)} {name_match.group(2)}" if name_match else "chunk"
+            out.append(f"// standard library boilerplate omitted: {name} (sha256 {digest[:12]})\n")
+        else:
+            out.append(chunk)
+    return ''.join(out)
 
-def create_payload(source_code , model_name):
+
+def truncate_source(source_code):
     """
-    根據模型名稱創建不同格式的請求內容
-    
+    超長源碼保留頭尾、截斷中部
+
+    LLM對提示的開頭和結尾最敏感；相比單純截斷尾部，
+    保留頭尾能同時覆蓋導入/聲明和尾部的自定義邏輯
+
     Args:
-        source_code (str): 智能合約源碼
-        model_name (str): 使用的LLM模型名稱("Grok", "DeepSeek", "ChatGPT")
-        
+        source_code (str): 去重後的合約源碼
+
     Returns:
-        dict或list: 適合指定模型的請求內容格式
+        str: 長度不超過MAX_SOURCE_CHARS的源碼
     """
-    messages = [
-            {
-                "role": "system",
-                "content": "You are an ERC20 smart contract security analyzer."
-            },
-            {
-                "role": "user",
-                "content": f"""Analyze this smart contract for security features and return a JSON array with the following properties based on the provided source code: {source_code}
+    if len(source_code) <= MAX_SOURCE_CHARS:
+        return source_code
+    head = (MAX_SOURCE_CHARS * 2) // 3
+    tail = MAX_SOURCE_CHARS - head
+    return (
+        source_code[:head]
+        + "\n// ... middle of source truncated ...\n"
+        + source_code[-tail:]
+    )
+
+# 單個合約源碼的最大字符數，確保整個批次不超過上下文窗口
+MAX_SOURCE_CHARS = 6000
+
+
+
+# 提示的固定部分在導入時構建一次，create_payload只在調用時拼接合約內容
+_SC_SYSTEM_MSG = {
+    "role": "system",
+    "content": "You are an ERC20 smart contract security analyzer."
+}
+
+_SC_INSTRUCTIONS_PREFIX = """Analyze each of the following smart contracts for security features and return one JSON object per contract based on the provided source code:
 
+"""
+
+_SC_INSTRUCTIONS_SUFFIX = """
                             1. isHoneyPot: Check if the token may not be sold due to contract functions or is designed to trap users.
                             Key Checks:
                             - Admin Abuse: Can the deployer drain funds (e.g., via privileged functions)?
@@ -72,18 +184,49 @@ def create_payload(source_code , model_name):
                             - Hidden Control: Is there blacklisting logic (even post-renunciation)?
                             - Obfuscation Tricks: Are there misleading names or structures hiding blacklist functionality?
                             transferPausable: Check if token transfers can be paused by the deployer or another address.
-                            
-                            """+
-                            """Format:
+
+                            """
+
+_SC_FORMAT_SUFFIX = """Format (one object per contract, keyed by its address):
                             ```json
                             [
-                              {"feature": "isHoneyPot", "value": "yes/no", "reason": "brief explanation"},
-                              {"feature": "isMintable", "value": "yes/no", "reason": "brief explanation"},
-                              {"feature": "isProxy", "value": "yes/no", "reason": "brief explanation"},
-                              {"feature": "isBlackList", "value": "yes/no", "reason": "brief explanation"},
-                              {"feature": "transferPausable", "value": "yes/no", "reason": "brief explanation"}
+                              {
+                                "contractAddress": "<address>",
+                                "features": [
+                                  {"feature": "isHoneyPot", "value": "yes/no", "reason": "brief explanation"},
+                                  {"feature": "isMintable", "value": "yes/no", "reason": "brief explanation"},
+                                  {"feature": "isProxy", "value": "yes/no", "reason": "brief explanation"},
+                                  {"feature": "isBlackList", "value": "yes/no", "reason": "brief explanation"},
+                                  {"feature": "transferPausable", "value": "yes/no", "reason": "brief explanation"}
+                                ]
+                              }
                             ]
                             ```"""
+
+
+def create_payload(source_codes , model_name):
+    """
+    根據模型名稱創建不同格式的請求內容
+
+    多個合約會被打包進同一個提示，指令前導只發送一次，
+    以分攤每次請求的固定token開銷
+
+    Args:
+        source_codes (list): (contract_address, source_code) 元組列表
+        model_name (str): 使用的LLM模型名稱("Grok", "DeepSeek", "ChatGPT")
+
+    Returns:
+        dict或list: 適合指定模型的請求內容格式
+    """
+    contracts_block = "\n".join(
+        f"### Contract {contract_address}\n{source_code}\n"
+        for contract_address, source_code in source_codes
+    )
+    messages = [
+            _SC_SYSTEM_MSG,
+            {
+                "role": "user",
+                "content": _SC_INSTRUCTIONS_PREFIX + contracts_block + _SC_INSTRUCTIONS_SUFFIX + _SC_FORMAT_SUFFIX
             }
         ]
     # 根據不同模型返回不同格式的請求內容
@@ -114,79 +257,111 @@ def extract_and_convert_to_json(result_str):
         list: 表示JSON數組的字典列表，解析失敗則返回None
     """
     try:
-        # 找到 JSON 開始和結束的位置
+        # 從第一個 "[" 開始單次掃描解碼，不複製子字串，
+        # 且容忍數組後面跟隨的說明文字
         start_idx = result_str.find("[")
-        end_idx = result_str.rfind("]") + 1
-
-        # 提取 JSON 子字串
-        json_str = result_str[start_idx:end_idx]
-
-        # 將字串轉換為 JSON
-        result_json = json.loads(json_str)
+        result_json, _ = _json_decoder.raw_decode(result_str, start_idx)
         return result_json
     except (ValueError, json.JSONDecodeError) as e:
         logging.info(f"Error parsing JSON: {e}")
         return None
 
 
-def xai_request(source_code):
+async def xai_request(xai_client, source_codes):
     """
-    向X.AI (Grok) API發送請求以分析智能合約
-    
+    向X.AI (Grok) API發送異步請求以分析一批智能合約
+
     Args:
-        source_code (str): 智能合約源碼
-        
+        xai_client (AsyncOpenAI): 當前事件循環內創建的X.AI客戶端
+        source_codes (list): (contract_address, source_code) 元組列表
+
     Returns:
         str: API的響應內容
     """
-    client = OpenAI(
-        api_key= GROK_API_KEY,
-        base_url="https://api.x.ai/v1",
-        )
-    
-    
-    messages = create_payload(source_code, "Grok")
-    completion = client.chat.completions.create(
+    messages = create_payload(source_codes, "Grok")
+
+    # 相同的合約批次重跑時直接命中磁盤緩存，跳過HTTPS調用
+    cache_key = llm_cache.make_key('grok-2-latest', messages)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    completion = await xai_client.chat.completions.create(
         model= 'grok-2-latest',
         messages=messages)
 
-    return completion.choices[0].message.content
+    result = completion.choices[0].message.content
+    llm_cache.set(cache_key, result)
+    return result
     
 class SmartContractClassifier:
-    def __init__(self, db_path,  log_file="../Real_Time_System/Log/smart_contracts_classifier.log"):
+    def __init__(self, db_path):
         self.db_path = db_path
-        # Initialize the classifier pipeline
-        # Initialize logging
-        logging.basicConfig(
-            filename=log_file,
-            level=logging.INFO,
-            format="%(asctime)s - %(levelname)s - %(message)s"
-        )
+        # LRU of sha256(normalized source) -> verdict; identical clones hit
+        # here without another LLM call
+        self._verdict_cache = OrderedDict()
+
 
-        
     def connect_db(self):
         try:
-            return sqlite3.connect(self.db_path)
+            conn = sqlite3.connect(self.db_path)
+            # WAL lets the verdict writer commit without blocking the read
+            # cursor; NORMAL sync skips the per-commit fsync safely under WAL.
+            # mmap + a 64MB page cache serve the large sourceCode blobs from
+            # memory instead of one pread per page on every run
+            for pragma in (
+                "journal_mode=WAL",
+                "synchronous=NORMAL",
+                "mmap_size=268435456",
+                "cache_size=-65536",
+                "temp_store=MEMORY",
+            ):
+                conn.execute(f"PRAGMA {pragma}")
+            # Covering index so the anti-join below is an index seek, not a scan
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_tokens_contract_verified
+                ON tokens(contractAddress, smart_contract_verified)
+            """)
+            # Older databases predate the sourceHash column used to persist
+            # per-source verdicts across restarts
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(tokens)")]
+            if "sourceHash" not in columns:
+                conn.execute("ALTER TABLE tokens ADD COLUMN sourceHash TEXT")
+            # ... and the compressed-source column written by newer scrapers
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(contracts)")]
+            if columns and "SourceCodeZstd" not in columns:
+                conn.execute("ALTER TABLE contracts ADD COLUMN SourceCodeZstd BLOB")
+            return conn
         except sqlite3.Error as e:
             logging.error(f"Database connection error: {e}")
             return None
 
     def get_unverified_contracts(self, conn):
+        """
+        Stream unverified contracts page by page instead of materializing
+        every source code blob up front; each page is at most PAGE_SIZE rows.
+        Newer scraper rows store the source zstd-compressed; decompress
+        transparently so downstream code keeps seeing plain text.
+        """
         try:
             cursor = conn.cursor()
             query = """
-                SELECT contractAddress, sourceCode 
-                FROM contracts 
-                WHERE contractAddress NOT IN (
-                    SELECT contractAddress 
-                    FROM tokens 
-                    WHERE smart_contract_verified IS NOT NULL
-                )
+                SELECT c.contractAddress, c.sourceCode, c.SourceCodeZstd
+                FROM contracts c
+                LEFT JOIN tokens t ON t.contractAddress = c.contractAddress
+                WHERE t.smart_contract_verified IS NULL
             """
-            return cursor.execute(query).fetchall()
+            cursor.execute(query)
+            while True:
+                rows = cursor.fetchmany(PAGE_SIZE)
+                if not rows:
+                    break
+                for contract_address, source_code, source_code_zstd in rows:
+                    if source_code_zstd is not None:
+                        source_code = _zstd_decompressor.decompress(source_code_zstd).decode("utf-8")
+                    yield contract_address, source_code
         except sqlite3.Error as e:
             logging.error(f"Error fetching contracts: {e}")
-            return []
         
     def parse_source_code(self, source_code, fetch_at=None):
         """
@@ -199,110 +374,273 @@ class SmartContractClassifier:
         """
         try:
             if isinstance(source_code, str) and source_code.strip().startswith('{'):
-                source_code = source_code.replace('{{', '{').replace('}}', '}')
-                source_code = source_code.replace('\n', '').replace('\r', '')
-                
+                source_code = source_code.strip()
+                # Etherscan wraps Standard-JSON-Input in one extra pair of
+                # braces; strip the outer pair once rather than rewriting
+                # every '{{' / '}}' in the body (which corrupts nested JSON)
+                if source_code.startswith('{{') and source_code.endswith('}}'):
+                    source_code = source_code[1:-1]
+                source_code = source_code.translate(_NEWLINE_STRIP)
+
+                # Stream the 'sources' mapping so each file's content is
+                # pulled one at a time and written straight into the output
+                # buffer, instead of json.loads holding every file twice
                 try:
-                    source_code = json.loads(source_code)
-                except json.JSONDecodeError as e:
+                    buf = io.StringIO()
+                    file_count = 0
+                    for _, file_obj in ijson.kvitems(io.StringIO(source_code), 'sources'):
+                        if isinstance(file_obj, dict) and 'content' in file_obj:
+                            if file_count:
+                                buf.write('\n')
+                            buf.write(file_obj['content'])
+                            file_count += 1
+                    if file_count:
+                        return buf.getvalue()
+                except ijson.JSONError as e:
                     logging.error(f"JSON parse error: {e}")
                     return None
-
-                source_code = source_code.get('sources', '') if isinstance(source_code, dict) else source_code
-                
-                if len(source_code) == 1:
-                    key_name = next(iter(source_code))
-                    return source_code[key_name]['content']
-                else:
-                    return '\n'.join(
-                        source_code[key]['content'] 
-                        for key in source_code 
-                        if isinstance(source_code[key], dict) and 'content' in source_code[key]
-                    )
         except Exception as e:
             logging.error(f"Source code parsing error: {e}")
             return None
 
-    def classify_contract(self, source_code):
-        try:
-            # Truncate source code if too long
+    async def classify_contracts_batch(self, xai_client, batch):
+        """
+        Classify a batch of contracts with a single LLM request.
+        Args:
+            xai_client: AsyncOpenAI client bound to the running event loop
+            batch: List of (contract_address, source_code) tuples
+        Returns:
+            Dict mapping contract_address to (verdict, source_hash) where the
+            verdict is 0 (not scam) / 1 (scam); contracts the model did not
+            answer for are simply absent
+        """
+        verdicts = {}
+        source_codes = []
+        source_hashes = {}
+        for contract_address, source_code in batch:
             source_code = self.parse_source_code(source_code)
             if not source_code:
-                return None
-            logging.info(f"Parsed source code: {source_code[:1000]}...")  # Log first 1000 characters for brevity
-            result = xai_request(source_code)
+                continue
+            # Strip repeated library boilerplate, then keep head+tail so the
+            # whole batch fits the context window
+            source_code = truncate_source(dedup_boilerplate(source_code))
+
+            # Identical clones (scam farms redeploy the same source) resolve
+            # from the verdict LRU without being marshaled into the prompt
+            src_hash = hashlib.sha256(source_code.encode("utf-8")).hexdigest()
+            cached_verdict = self._verdict_cache.get(src_hash)
+            if cached_verdict is not None:
+                self._verdict_cache.move_to_end(src_hash)
+                logging.info(f"Verdict cache hit for contract {contract_address}")
+                verdicts[contract_address] = (cached_verdict, src_hash)
+                continue
+
+            source_hashes[contract_address] = src_hash
+            source_codes.append((contract_address, source_code))
+
+        if not source_codes:
+            return verdicts
+
+        try:
+            result = await xai_request(xai_client, source_codes)
             result_json = extract_and_convert_to_json(result)
 
-            
-                
-            converted_result = {
-                item["feature"]: {"value": item["value"], "reason": item["reason"]}
-                for item in result_json
-            }
-            logging.info(f"Classification result: {converted_result}")
+            for entry in result_json:
+                contract_address = entry["contractAddress"]
+                features = entry["features"]
+
+                # Single pass: any feature answered other than "no" marks a scam
+                is_scam = int(any(item.get("value") != "no" for item in features))
 
-            # if all value is 0 , then it is not a scam
-            if all(item["value"] == "no" for item in converted_result.values()):
-                logging.info("Contract classified as not a scam.")
-                return 0
-            else:
-                logging.info("Contract classified as a scam.")
-                return 1
+                # The feature/reason dict is only needed for the log line,
+                # so skip building it when INFO logging is off
+                if logging.getLogger().isEnabledFor(logging.INFO):
+                    converted_result = {
+                        item["feature"]: {"value": item["value"], "reason": item["reason"]}
+                        for item in features
+                    }
+                    logging.info(f"Classification result for {contract_address}: {converted_result}")
+                    logging.info(f"Contract {contract_address} classified as {'a scam' if is_scam else 'not a scam'}.")
 
+                src_hash = source_hashes.get(contract_address)
+                verdicts[contract_address] = (is_scam, src_hash)
+
+                # Remember the verdict for future clones of this source
+                if src_hash:
+                    self._verdict_cache[src_hash] = is_scam
+                    self._verdict_cache.move_to_end(src_hash)
+                    if len(self._verdict_cache) > VERDICT_CACHE_SIZE:
+                        self._verdict_cache.popitem(last=False)
 
         except Exception as e:
-            return None
+            logging.error(f"Error classifying contract batch: {e}")
 
-    def update_token_table(self, conn, contract_address, is_scam):
+        return verdicts
+
+    def update_token_table(self, conn, updates):
+        """
+        Persist a batch of (is_scam, source_hash, contract_address) verdicts
+        with one executemany and a single commit instead of an fsync per
+        contract. The stored source hash lets the verdict cache be reseeded
+        from the database after a restart.
+        """
+        if not updates:
+            return
         try:
-            cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE tokens 
-                SET smart_contract_verified = ? 
+            conn.executemany("""
+                UPDATE tokens
+                SET smart_contract_verified = ?, sourceHash = ?
                 WHERE contractAddress = ?
-            """, (is_scam, contract_address))
+            """, updates)
             conn.commit()
         except sqlite3.Error as e:
             logging.error(f"Error updating token table: {e}")
             conn.rollback()
 
+    def load_verdict_cache(self, conn):
+        """
+        Seed the in-memory verdict cache from previously classified rows so
+        known-clean / known-scam sources skip the LLM even after a restart.
+        """
+        try:
+            rows = conn.execute("""
+                SELECT sourceHash, smart_contract_verified
+                FROM tokens
+                WHERE sourceHash IS NOT NULL
+                  AND smart_contract_verified IS NOT NULL
+            """).fetchall()
+            for src_hash, verdict in rows[-VERDICT_CACHE_SIZE:]:
+                self._verdict_cache[src_hash] = verdict
+            logging.info(f"Seeded verdict cache with {len(self._verdict_cache)} known source hashes")
+        except sqlite3.Error as e:
+            logging.error(f"Error seeding verdict cache: {e}")
+
+    async def _produce_batches(self, conn, batch_queue):
+        """Stream contract rows from the DB and pack them into LLM batches."""
+        batch = []
+        count = 0
+        for row in self.get_unverified_contracts(conn):
+            batch.append(row)
+            count += 1
+            if len(batch) == BATCH_SIZE:
+                await batch_queue.put(batch)
+                batch = []
+        if batch:
+            await batch_queue.put(batch)
+        logging.info(f"Found {count} unverified contracts to process.")
+        # One sentinel per consumer so every worker shuts down
+        for _ in range(MAX_CONCURRENT_REQUESTS):
+            await batch_queue.put(None)
+
+    async def _consume_batches(self, xai_client, batch_queue, verdict_queue):
+        """Classify queued batches until the producer's sentinel arrives."""
+        while True:
+            batch = await batch_queue.get()
+            if batch is None:
+                break
+            verdicts = await self.classify_contracts_batch(xai_client, batch)
+            if verdicts:
+                await verdict_queue.put(verdicts)
+
+    async def _write_verdicts(self, conn, verdict_queue):
+        """Drain classification verdicts and persist them to the tokens table."""
+        pending_updates = []
+        while True:
+            verdicts = await verdict_queue.get()
+            if verdicts is None:
+                break
+            for contract_address, (is_scam, src_hash) in verdicts.items():
+                pending_updates.append((is_scam, src_hash, contract_address))
+                logging.info(f"Processed contract {contract_address}: {'Scam' if is_scam else 'Not Scam'}")
+            # Flush in batches so each commit amortizes its fsync over many rows
+            if len(pending_updates) >= WRITE_BATCH_SIZE:
+                self.update_token_table(conn, pending_updates)
+                pending_updates = []
+        self.update_token_table(conn, pending_updates)
+
+    async def _run_once(self):
+        # Separate connections so the streaming read cursor is not disturbed
+        # by the verdict writes happening while classification is in flight
+        read_conn = self.connect_db()
+        write_conn = self.connect_db()
+        if not read_conn or not write_conn:
+            return
+        # The client (and its httpx pool) must live and die inside this
+        # event loop: run() calls asyncio.run() per poll tick, and keepalive
+        # connections bound to a closed loop fail every later request with
+        # "Event loop is closed"
+        xai_client = AsyncOpenAI(
+            api_key=GROK_API_KEY,
+            base_url="https://api.x.ai/v1",
+        )
+        try:
+            # Bounded queues overlap the DB fetch with in-flight LLM requests,
+            # keeping peak memory at O(queue * batch) instead of O(all contracts)
+            batch_queue = asyncio.Queue(maxsize=128)
+            verdict_queue = asyncio.Queue()
+
+            writer = asyncio.create_task(self._write_verdicts(write_conn, verdict_queue))
+            await asyncio.gather(
+                self._produce_batches(read_conn, batch_queue),
+                *[
+                    self._consume_batches(xai_client, batch_queue, verdict_queue)
+                    for _ in range(MAX_CONCURRENT_REQUESTS)
+                ],
+            )
+            await verdict_queue.put(None)
+            await writer
+
+        finally:
+            await xai_client.close()
+            read_conn.close()
+            write_conn.close()
+
     def run(self):
         logging.info("Starting Smart Contract Classifier")
-        while True:
-            conn = self.connect_db()
-            if conn:
-                try:
-                    # Get unverified contracts
-                    contracts = self.get_unverified_contracts(conn)
-                    logging.info(f"Found {len(contracts)} unverified contracts to process.")
-                    
-                    for contract_address, source_code in contracts:
-                        # Classify the contract
-                        logging.info(f"Processing contract {contract_address}")
-                        is_scam = self.classify_contract(source_code)
-                        
-                        if is_scam is not None:
-                            # Update the token table
-                            self.update_token_table(conn, contract_address, is_scam)
-                            logging.info(f"Processed contract {contract_address}: {'Scam' if is_scam else 'Not Scam'}")
-                
-                finally:
-                    conn.close()
-            
-            # Wait for 60 seconds before next iteration
-            time.sleep(60)
+
+        # PRAGMA data_version bumps whenever another connection commits, so a
+        # long-lived watcher connection detects new scraper writes without
+        # running the full anti-join query on every tick
+        watch_conn = self.connect_db()
+        if watch_conn:
+            self.load_verdict_cache(watch_conn)
+        last_version = None
+        poll_interval = MIN_POLL_INTERVAL
+
+        try:
+            while True:
+                version = None
+                if watch_conn:
+                    try:
+                        version = watch_conn.execute("PRAGMA data_version").fetchone()[0]
+                    except sqlite3.Error as e:
+                        logging.error(f"Error reading data_version: {e}")
+
+                if version is None or version != last_version:
+                    asyncio.run(self._run_once())
+                    last_version = version
+                    # New data arrived recently; poll again quickly
+                    poll_interval = MIN_POLL_INTERVAL
+                else:
+                    # Nothing changed; back off up to the old 60-second cadence
+                    poll_interval = min(poll_interval * 2, MAX_POLL_INTERVAL)
+
+                time.sleep(poll_interval)
+        finally:
+            if watch_conn:
+                watch_conn.close()
 
 
 
 if __name__ == "__main__":
-    classifier = SmartContractClassifier(DB_PATH, log_file="../Real_Time_System/Log/smart_contracts_classifier.log")
+    classifier = SmartContractClassifier(DB_PATH)
+    # run() only returns on a crash; the outer loop just restarts it
     while True:
         try:
             classifier.run()
-            logging.info("Waiting 5 minutes before next scrape...")
-            time.sleep(300)  # 300 seconds = 5 minutes
         except KeyboardInterrupt:
             logging.info("Classifier stopped by user")
+            break
         except Exception as e:
             logging.error(f"Unexpected error: {e}")
             time.sleep(300)  # 300 seconds = 5 minutes
\ No newline at end of file
@@ -1,18 +1,28 @@
 import os
 from dotenv import load_dotenv
-import pandas as pd
+from collections import defaultdict
 import json
-import requests
+import httpx
+import asyncio
 import sqlite3
 import logging
 from datetime import datetime
-import time
-import schedule
+from llm_cache import LLMCache
 
 load_dotenv()  # 加載.env文件中的環境變量
 DB_PATH = os.getenv("DB_PATH")  # 從環境變量中獲取數據庫路徑
 DS_API_KEY = os.getenv("DS_API_KEY")
 
+# LLM響應的磁盤緩存，調度器重跑時相同的推文歷史直接命中緩存
+llm_cache = LLMCache("./.llm_cache")
+
+# 模塊級HTTP/2客戶端，所有請求復用同一個持久連接池，省去每次TLS握手
+http_client = httpx.AsyncClient(
+    http2=True,
+    timeout=60,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+)
+
 # 設置日誌配置
 log_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "Log"))
 if not os.path.exists(log_dir):
@@ -32,78 +42,71 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# 復用同一個解碼器對象，raw_decode可在任意偏移量單次解碼
+_json_decoder = json.JSONDecoder()
+
+# 限制同時向DeepSeek API發送的請求數量，避免超過速率限制
+MAX_CONCURRENT_REQUESTS = 16
+
 
 
 def get_active_twitter_accounts(conn):
-    """Get active Twitter accounts from database"""
+    """Get active Twitter accounts from database as sqlite3.Row objects"""
     logger.info("Fetching active Twitter accounts")
     query = """
-    SELECT user_id, username 
-    FROM twitter_users 
+    SELECT user_id, username
+    FROM twitter_users
     WHERE available = 'True'
     """
-    accounts = pd.read_sql_query(query, conn)
+    accounts = conn.execute(query).fetchall()
     logger.info(f"Found {len(accounts)} active Twitter accounts")
     return accounts
 
 def get_tweets_history(conn, user_id):
-    """Get tweet history for a given user_id"""
+    """Get tweet history for a given user_id as sqlite3.Row objects"""
     logger.info(f"Fetching tweets history for user_id: {user_id}")
-    query = f"""
-    SELECT user_id, tweet_full_text, tweet_created_at 
-    FROM tweets 
+    query = """
+    SELECT user_id, tweet_full_text, tweet_created_at
+    FROM tweets
     WHERE user_id = ?
     """
-    tweets = pd.read_sql_query(query, conn, params=(user_id,))
+    tweets = conn.execute(query, (user_id,)).fetchall()
     logger.info(f"Retrieved {len(tweets)} tweets for user_id: {user_id}")
     return tweets
 
-def get_response(payload, url, headers):
+async def get_response(payload, url, headers):
     """
     向指定URL發送POST請求並獲取響應
-    
+
+    請求通過模塊級的HTTP/2連接池發送，避免每次調用重建連接
+
     Args:
         payload (dict): 請求內容
         url (str): API端點URL
         headers (dict): HTTP請求頭
-        
+
     Returns:
         dict: API響應的JSON內容
     """
     try:
         logger.debug(f"Sending POST request to {url}")
-        response = requests.request("POST", url, json=payload, headers=headers)
+        response = await http_client.post(url, json=payload, headers=headers)
         response.raise_for_status()  # 檢查 HTTP 錯誤
         return response.json()
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Request error: {e}")
         raise
     except json.JSONDecodeError as e:
         logger.error(f"JSON decode error: {e}")
         raise
 
-def create_payload(token_name, history, score, model_name):
-    """
-    根據指定的模型創建API請求負載
-    
-    Args:
-        token_name (str): 代幣名稱
-        history (str): 代幣相關推文歷史
-        score (float): 相似度評分
-        model_name (str): 要使用的模型名稱
-        
-    Returns:
-        list/dict: 適合指定模型API的請求格式
-    """
-    # 創建通用的消息內容
-    messages = [
-            {
-                "role": "system",
-                "content": "You are an AI agent that classifies cryptocurrency tokens as scam (isScam = 1) or non-scam (isScam = 0) based on  Twitter history. Evaluate post frequency, content quality, engagement, and token name. Use a balanced scoring approach to avoid defaulting to scam. Return a JSON object with classification, confidence, and reasoning."
-            },
-            {
-                "role": "user",
-                "content": """Classify cryptocurrency tokens as scam (isScam = 1) or non-scam (isScam = 0) using  Twitter history.
+# 提示的固定部分在導入時構建一次，create_payload只在調用時拼接代幣輸入
+_TW_SYSTEM_MSG = {
+    "role": "system",
+    "content": "You are an AI agent that classifies cryptocurrency tokens as scam (isScam = 1) or non-scam (isScam = 0) based on  Twitter history. Evaluate post frequency, content quality, engagement, and token name. Use a balanced scoring approach to avoid defaulting to scam. Return a JSON object with classification, confidence, and reasoning."
+}
+
+_TW_INSTRUCTIONS = """Classify cryptocurrency tokens as scam (isScam = 1) or non-scam (isScam = 0) using  Twitter history.
                               
                     **Classification Criteria**:
                     1. **Post Frequency (30%)**:
@@ -135,13 +138,9 @@ def create_payload(token_name, history, score, model_name):
                         - Output: {'token_name': 'MuskMoonCoin', 'is_scam': 1, 'confidence': 0.95, 'reasoning': 'Exploitative name (Musk). Single hype post, no technical details, no engagement.'}
                         - **Non-Scam**: Token Name: GameChain, Twitter History: [{'timestamp': '2025-05-01', 'content': 'Partnered with Web3 studio! #GameChain'}, {'timestamp': '2025-06-01', 'content': 'Audit done, Coingecko listed!'}]
                         - Output: {'token_name': 'GameChain', 'is_scam': 0, 'confidence': 0.90, 'reasoning': 'Project-aligned name. Multiple posts with partnerships and audits, community-focused.'}
-                    """+
-                    f"""
-                    Input:
-                    Token Name:{token_name}
-                    Twitter History: {history}
-                    """+
                     """
+
+_TW_FORMAT_SUFFIX = """
                             Output Format::
                             ```json
                             {
@@ -151,9 +150,35 @@ def create_payload(token_name, history, score, model_name):
                                 'reasoning': '<brief explanation>'
                                 }
                             ```"""
+
+
+def create_payload(token_name, history, score, model_name):
+    """
+    根據指定的模型創建API請求負載
+
+    Args:
+        token_name (str): 代幣名稱
+        history (str): 代幣相關推文歷史
+        score (float): 相似度評分
+        model_name (str): 要使用的模型名稱
+
+    Returns:
+        list/dict: 適合指定模型API的請求格式
+    """
+    # 創建通用的消息內容，固定指令部分復用模塊級常量
+    messages = [
+            _TW_SYSTEM_MSG,
+            {
+                "role": "user",
+                "content": _TW_INSTRUCTIONS +
+                    f"""
+                    Input:
+                    Token Name:{token_name}
+                    Twitter History: {history}
+                    """ + _TW_FORMAT_SUFFIX
             }
              ]
-    
+
     # 根據不同模型返回不同格式的請求內容
     if model_name == "Grok":
         return messages
@@ -181,22 +206,17 @@ def extract_and_convert_to_json(result_str):
         dict: 解析後的JSON對象，解析失敗則返回None
     """
     try:
-        # 找到JSON開始和結束的位置
+        # 從第一個 "{" 開始單次掃描解碼，不複製子字符串，
+        # 且容忍對象後面跟隨的說明文字
         start_idx = result_str.find("{")
-        end_idx = result_str.rfind("}") + 1
-        
-        # 提取JSON子字符串
-        json_str = result_str[start_idx:end_idx]
-        
-        # 將字符串轉換為JSON
-        result_json = json.loads(json_str)
+        result_json, _ = _json_decoder.raw_decode(result_str, start_idx)
         logger.debug(f"Successfully parsed JSON: {result_json}")
         return result_json
     except (ValueError, json.JSONDecodeError) as e:
         logger.error(f"Error parsing JSON: {e}")
         return None
 
-def ds_request(token_name, history, score):
+async def ds_request(token_name, history, score):
     """
     向DeepSeek API發送請求
     
@@ -215,10 +235,19 @@ def ds_request(token_name, history, score):
             "Authorization": f"Bearer {DS_API_KEY}",
             "Content-Type": "application/json"}
     payload = create_payload(token_name, history, score, "DeepSeek")
+
+    # 相同的推文歷史重跑時直接命中磁盤緩存，跳過HTTPS調用
+    cache_key = llm_cache.make_key("deepseek-ai/DeepSeek-V3", payload)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"Cache hit for token: {token_name}")
+        return cached
+
     logger.info(f"Sending request to DeepSeek API for token: {token_name}")
-    response = get_response(payload, url, headers)
+    response = await get_response(payload, url, headers)
     logger.info(f"Received response from DeepSeek API for token: {token_name}")
-    
+    llm_cache.set(cache_key, response)
+
     return response
 
 def update_token_verification(conn, username, is_scam):
@@ -238,7 +267,59 @@ def update_token_verification(conn, username, is_scam):
         logger.error(f"SQLite error when updating token verification for {username}: {e}")
         raise
 
-def main():
+async def classify_account(conn, account, semaphore):
+    """Classify one account's tweet history through the DeepSeek API"""
+    try:
+        logger.info(f"Processing Twitter account: {account['username']} (ID: {account['user_id']})")
+        # Get tweets history
+        tweets = get_tweets_history(conn, account['user_id'])
+
+        if not tweets:
+            # If no tweets found, mark as scam
+            logger.warning(f"No tweets found for {account['username']}, marking as scam")
+            update_token_verification(conn, account['username'], 1)
+            return
+
+        logger.info(f"Processing {len(tweets)} tweets for {account['username']}")
+
+        # Group tweets by date in a single pass, keeping every tweet of a day
+        tweets_by_date = defaultdict(list)
+        for tweet in tweets:
+            date = datetime.fromisoformat(tweet['tweet_created_at']).date()
+            tweets_by_date[str(date)].append(tweet['tweet_full_text'])
+        tweets_history = dict(sorted(tweets_by_date.items()))
+
+        # Get classification through ds_request so replays hit the disk cache;
+        # the semaphore keeps in-flight API requests under the rate limit
+        logger.info(f"Requesting classification for {account['username']}")
+        async with semaphore:
+            response = await ds_request(account['username'], tweets_history, 0)
+
+        # Extract classification result
+        if 'choices' in response:
+            result = extract_and_convert_to_json(response['choices'][0]['message']['content'])
+            if result and 'is_scam' in result:
+                logger.info(f"Classification result for {account['username']}: is_scam={result['is_scam']}, confidence={result.get('confidence', 'N/A')}")
+                # Update database with classification result
+                update_token_verification(conn, account['username'], result['is_scam'])
+            else:
+                logger.warning(f"Could not extract valid result from API response for {account['username']}")
+        else:
+            logger.error(f"Invalid API response format for {account['username']}: {response}")
+    except Exception as e:
+        logger.error(f"Error processing account {account['username']}: {e}", exc_info=True)
+
+
+async def classify_accounts(conn, active_accounts):
+    """Fan out classification of all active accounts with bounded concurrency"""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    await asyncio.gather(*(
+        classify_account(conn, account, semaphore)
+        for account in active_accounts
+    ))
+
+
+async def main():
     # Database connection
     logger.info("Starting Twitter account real-time classifier")
     conn = None
@@ -255,61 +336,13 @@ def main():
         logger.info(f"Connecting to database at {DB_PATH}")
         
         conn = sqlite3.connect(DB_PATH)
+        conn.row_factory = sqlite3.Row  # 以列名訪問查詢結果
         logger.info("Database connection established")
-        
-        # DeepSeek API configuration
-        url = "https://api.siliconflow.cn/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {DS_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        logger.info("DeepSeek API configured")
-        
-        # Get active Twitter accounts
+
+        # Get active Twitter accounts and classify them concurrently; every
+        # request shares the module-level HTTP/2 connection pool
         active_accounts = get_active_twitter_accounts(conn)
-        
-        for _, account in active_accounts.iterrows():
-            try:
-                logger.info(f"Processing Twitter account: {account['username']} (ID: {account['user_id']})")
-                # Get tweets history
-                tweets = get_tweets_history(conn, account['user_id'])
-                
-                if tweets.empty:
-                    # If no tweets found, mark as scam
-                    logger.warning(f"No tweets found for {account['username']}, marking as scam")
-                    update_token_verification(conn, account['username'], 1)
-                    continue
-                
-                # Process tweets data
-                tweets['date'] = pd.to_datetime(tweets['tweet_created_at']).dt.date
-                logger.info(f"Processing {len(tweets)} tweets for {account['username']}")
-                
-                # Group tweets by date
-                tweets_history = {
-                    str(date): texts 
-                    for date, texts in zip(tweets['date'], tweets['tweet_full_text'])
-                }
-                
-                # Create payload and get classification
-                logger.info(f"Creating API payload for {account['username']}")
-                payload = create_payload(account['username'], tweets_history, 0, "DeepSeek")
-                logger.info(f"Sending request to DeepSeek API for {account['username']}")
-                response = get_response(payload, url, headers)
-                logger.info(f"Received response from DeepSeek API for {account['username']}")
-                
-                # Extract classification result
-                if 'choices' in response:
-                    result = extract_and_convert_to_json(response['choices'][0]['message']['content'])
-                    if result and 'is_scam' in result:
-                        logger.info(f"Classification result for {account['username']}: is_scam={result['is_scam']}, confidence={result.get('confidence', 'N/A')}")
-                        # Update database with classification result
-                        update_token_verification(conn, account['username'], result['is_scam'])
-                    else:
-                        logger.warning(f"Could not extract valid result from API response for {account['username']}")
-                else:
-                    logger.error(f"Invalid API response format for {account['username']}: {response}")
-            except Exception as e:
-                logger.error(f"Error processing account {account['username']}: {e}", exc_info=True)
+        await classify_accounts(conn, active_accounts)
     
     except sqlite3.Error as e:
         logger.error(f"SQLite error: {e}", exc_info=True)
@@ -323,12 +356,12 @@ def main():
             
     logger.info("Twitter account real-time classifier completed")
 
-if __name__ == "__main__":
-    
-    # Schedule the job to run daily
-    schedule.every(1).days.do(main)
-    
-    # Keep the script running
+async def scheduler():
+    """每天運行一次分類器，兩次運行之間不做任何喚醒"""
     while True:
-        schedule.run_pending()
-        time.sleep(60)  # Check every minute
\ No newline at end of file
+        await main()
+        await asyncio.sleep(24 * 3600)
+
+
+if __name__ == "__main__":
+    asyncio.run(scheduler())
\ No newline at end of file
@@ -8,7 +8,10 @@
 # 作者：ICO-DataHub團隊
 #==================================================================================
 
+import re  # 用於校驗動態拼接的表名/列名
 import sqlite3  # 導入SQLite數據庫API模塊
+import threading  # 用於保護共享連接的互斥鎖
+import zstandard  # 用於壓縮/解壓存放在contracts表中的合約源碼
 
 
 class DatabaseManager:
@@ -18,14 +21,224 @@ class DatabaseManager:
     專門用於處理加密貨幣相關數據。
     """
     
+    # 每個連接需要應用的PRAGMA設置：
+    # WAL讓讀取不被寫入阻塞（持久設置，寫入一次即可）；
+    # synchronous=NORMAL在WAL下安全地省去每次提交的fsync；
+    # 其餘設置增大緩存並啟用內存映射IO，減少系統調用
+    CONNECTION_PRAGMAS = (
+        "journal_mode=WAL",
+        "synchronous=NORMAL",
+        "temp_store=MEMORY",
+        "cache_size=-65536",
+        "mmap_size=268435456",
+        "busy_timeout=30000",
+    )
+
+    # 只讀連接適用的PRAGMA子集：journal_mode/synchronous涉及寫路徑，
+    # 在mode=ro的連接上無法設置
+    RO_CONNECTION_PRAGMAS = (
+        "temp_store=MEMORY",
+        "cache_size=-65536",
+        "mmap_size=268435456",
+        "busy_timeout=30000",
+    )
+
+    # 合法SQL標識符（表名/列名）的格式：DDL輔助方法用f-string拼接
+    # 動態名稱，必須先通過此校驗，避免注入任意SQL片段
+    _IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+    # 共享的zstd解壓器：解壓contracts.SourceCodeZstd中的合約源碼
+    _ZSTD_DECOMPRESSOR = zstandard.ZstdDecompressor()
+
+
+    # 查詢熱路徑所需的索引：create_indexes與bootstrap_schema共用
+    _INDEX_DDL = (
+        """
+        CREATE INDEX IF NOT EXISTS idx_tokens_contract_verified
+        ON tokens(contractAddress, smart_contract_verified)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_contracts_missing_src
+        ON contracts(ContractAddress)
+        WHERE SourceCodeZstd IS NULL AND (SourceCode IS NULL OR SourceCode = '')
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_tokens_social_nulls
+        ON tokens(ContractAddress)
+        WHERE TwitterUrl IS NULL OR TwitterUser IS NULL
+           OR WebsiteUrl IS NULL OR TelegramUrl IS NULL
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_tokens_twitter_user
+        ON tokens(TwitterUser)
+        """,
+    )
+
+    # 索引謂詞引用的新列：在這些列加入之前建立的舊數據庫上，
+    # 建索引前必須先補齊，否則部分索引的DDL會因"no such column"失敗
+    _COLUMN_MIGRATIONS = (
+        ("contracts", "SourceCodeZstd", "BLOB"),
+    )
+
+    # 各表的結構定義：create_*_table與bootstrap_schema共用同一份DDL文本
+    _TOKENS_SCHEMA = """
+            ContractAddress TEXT PRIMARY KEY,   -- 代幣的唯一識別符（智能合約地址）
+            pairAddress TEXT,          -- 代幣交易對地址（用於DEX流動性池）
+            Owner TEXT ,                -- 代幣合約擁有者地址
+            Creator TEXT,              -- 代幣合約創建者地址
+            TokenName TEXT NOT NULL,            -- 代幣名稱
+            Symbol TEXT NOT NULL,               -- 代幣符號（如ETH、BTC）
+            TotalSupply INTEGER,       -- 代幣總供應量
+            Decimal INTEGER,           -- 代幣小數位數
+            CreatedBlock INTEGER,     -- 代幣創建時的區塊號
+            TwitterUrl TEXT,                -- 代幣的Twitter（X）頁面URL
+            WebsiteUrl TEXT,                -- 代幣的官方網站URL
+            TwitterUser TEXT,              -- 代幣的Twitter用戶名
+            TelegramUrl TEXT,               -- 代幣的Telegram頻道URL
+            WhitepaperUrl TEXT,             -- 代幣白皮書URL
+            isScam TEXT,                    -- 指示代幣是否為詐騙幣（true/false）
+            isPotentialSpam TEXT,           -- 指示代幣是否為潛在垃圾幣（true/false）
+            safetyLevel TEXT,               -- 代幣的安全級別評估
+            spamCode INT,                   -- 垃圾幣類型的編碼
+            attackTypes TEXT,               -- 與代幣相關的攻擊類型（多個類型以逗號分隔）
+            is_open_source TEXT,            -- 指示代幣合約是否開源（true/false）
+            is_honeypot TEXT,               -- 指示代幣是否為蜜罐（無法賣出的騙局）（true/false）
+            is_mintable TEXT,                -- 指示代幣是否可鑄造（增發）（true/false）
+            is_proxy TEXT,                  -- 指示代幣是否為代理合約（true/false）
+            slippage_modifiable TEXT,       -- 指示代幣是否可修改滑點（true/false）
+            is_blacklisted TEXT,            -- 指示代幣是否具有黑名單功能（true/false）
+            min_sell_tax FLOAT,             -- 代幣的最低賣出稅率（百分比）
+            max_sell_tax FLOAT,             -- 代幣的最高賣出稅率（百分比）
+            min_buy_tax FLOAT,              -- 代幣的最低買入稅率（百分比）
+            max_buy_tax FLOAT,              -- 代幣的最高買入稅率（百分比）
+            is_contract_renounced TEXT,     -- 指示合約所有權是否已放棄（true/false）
+            is_potentially_scam TEXT,       -- 指示代幣是否為潛在詐騙（true/false）
+            transfer_pausable TEXT,         -- 指示代幣轉賬功能是否可暫停（true/false）
+            warnings TEXT,                   -- 與代幣相關的警告信息
+            FetchedAt TEXT,                 -- 獲取代幣數據的時間戳
+            creationTime TEXT,              -- 代幣創建時間
+            firstSwapTimestamp TEXT,        -- 代幣首次交易時間戳
+            locksCreatedAt TEXT,            -- 代幣流動性鎖定創建時間
+            creatorAddress TEXT,
+            smart_contract_verified INT,
+            twitter_verified INT,
+            sourceHash TEXT                 -- 規範化合約源碼的SHA-256，用於跨重啟復用判定結果
+        """
+
+    _CONTRACTS_SCHEMA = """
+            ContractAddress TEXT PRIMARY KEY,    -- 智能合約地址，作為唯一識別符
+            SourceCode TEXT,                     -- 合約源代碼（可能是多個文件的JSON格式；新數據改存壓縮列）
+            SourceCodeZstd BLOB,                 -- zstd壓縮後的合約源代碼（壓縮率約4-8倍，讀取時用get_source_code解壓）
+            CompilerVersion TEXT,                -- 編譯合約所用的Solidity編譯器版本
+            OptimizationUsed TEXT,               -- 是否使用了編譯優化（"1"表示是，"0"表示否）
+            Runs TEXT,                           -- 優化運行次數設置
+            EVMVersion TEXT,                     -- 目標EVM（以太坊虛擬機）版本
+            Library TEXT,                        -- 合約使用的外部庫
+            LicenseType TEXT,                    -- 合約源代碼的許可證類型（如MIT、GPL等）
+            Proxy TEXT,                          -- 是否為代理合約
+            Implementation TEXT,                 -- 若為代理合約，其實現合約的地址
+            SwarmSource TEXT,                    -- SWARM源（分布式存儲中的源代碼引用）
+            FetchedAt TEXT                       -- 獲取合約數據的時間戳
+        """
+
+    _TWEETS_SCHEMA = """
+            user_id TEXT NOT NULL,               -- 發布推文的用戶ID
+            tweet_id TEXT PRIMARY KEY,           -- 推文的唯一識別符
+            tweet_full_text TEXT,                -- 推文的完整文本內容
+            tweet_favorite_count INTEGER,        -- 推文獲得的點讚數
+            tweet_view_count INTEGER,            -- 推文的瀏覽次數
+            tweet_quote_count INTEGER,           -- 推文的引用次數
+            tweet_reply_count INTEGER,           -- 推文的回覆數
+            tweet_retweet_count INTEGER,         -- 推文的轉發數
+            tweet_created_at TEXT,               -- 推文的創建時間
+            user_name TEXT,                      -- 發布推文的用戶名
+            tweet_mention_list TEXT              -- 推文中提及的用戶列表（JSON格式）
+        """
+
+    _TWITTER_USERS_SCHEMA = """
+                user_id TEXT NOT NULL,                  -- Twitter用戶的數字ID
+                username TEXT PRIMARY KEY,        -- Twitter用戶名（主鍵，唯一識別符）
+                description TEXT,                 -- 用戶的個人簡介
+                created_time TEXT,                -- 用戶賬號創建時間
+                available TEXT                    -- 用戶賬號是否可用（"true"/"false"）
+                
+            """
+
+    _OWNER_TXN_SCHEMA = """
+                owner TEXT NOT NULL,              -- 交易關聯的代幣擁有者地址
+                blockNumber INT,                  -- 包含此交易的區塊號
+                blockHash TEXT,                   -- 包含此交易的區塊哈希值
+                timeStamp INT,                    -- 交易的時間戳（Unix時間格式）
+                hash TEXT PRIMARY KEY,            -- 交易的唯一哈希值（主鍵）
+                nonce INT,                        -- 交易發送者的nonce值（交易計數器）
+                transactionIndex INT,             -- 交易在區塊中的索引位置
+                fromAddress TEXT,                 -- 交易發送方的地址
+                toAddress TEXT,                   -- 交易接收方的地址
+                value INT,                        -- 交易中轉移的以太幣/代幣數量（以wei為單位）
+                gas INT,                          -- 交易的燃料限制
+                gasPrice INT,                     -- 交易的燃料價格（以wei為單位）
+                input TEXT,                       -- 交易的輸入數據（智能合約調用數據）
+                methodId TEXT,                    -- 調用的合約方法ID（函數選擇器）
+                functionName TEXT,                -- 調用的合約函數名稱
+                contractAddress TEXT,             -- 相關智能合約的地址
+                cumulativeGasUsed INT,            -- 交易執行時的累計燃料使用量
+                gasUsed INT,                      -- 此交易消耗的燃料量
+                confirmations INT,                -- 交易確認數
+                isError TEXT                      -- 交易執行是否出錯（"0"表示成功，"1"表示失敗）
+            """
+
     def __init__(self, db_path):
         """
         初始化數據庫管理器。
-        
+
         參數:
             db_path (str): SQLite數據庫文件的路徑。如果該文件不存在，將被自動創建。
         """
         self.db_path = db_path  # 保存數據庫路徑以供後續方法使用
+        # 長駐連接：避免每次查詢重新connect/close，並讓SQLite頁緩存保持熱態。
+        # check_same_thread=False允許跨線程使用，互斥鎖保證同一時刻只有一個調用者
+        self._lock = threading.Lock()
+        # cached_statements調高到256：爬蟲/分類器反覆執行同一批
+        # 參數化語句，加大隱式語句緩存可完全省去重複的解析與規劃
+        self._conn = sqlite3.connect(db_path, check_same_thread=False,
+                                     cached_statements=256)
+        self._configure(self._conn)
+        # 每線程一個只讀連接：讀取不經過互斥鎖，多個讀取者真正並行
+        self._local = threading.local()
+
+    def _configure(self, connection):
+        """
+        對新建立的連接應用PRAGMA設置。
+
+        WAL是持久設置，其餘（synchronous、cache、mmap等）是連接級設置，
+        必須在每個連接上重新應用。
+
+        參數:
+            connection: 要配置的sqlite3連接對象。
+        """
+        for pragma in self.CONNECTION_PRAGMAS:
+            connection.execute(f"PRAGMA {pragma}")
+        return connection
+
+    def get_ro_connection(self):
+        """
+        返回當前線程專用的只讀連接，首次調用時建立並緩存。
+
+        mode=ro的URI連接不會觸碰WAL寫鎖路徑，且WAL下讀取者
+        不被寫入者阻塞；每個線程獨享一個連接，SELECT不需要
+        與寫入者共搶互斥鎖。
+
+        返回:
+            sqlite3.Connection: 本線程的只讀連接。
+        """
+        conn = getattr(self._local, "ro_conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True,
+                                   cached_statements=256)
+            for pragma in self.RO_CONNECTION_PRAGMAS:
+                conn.execute(f"PRAGMA {pragma}")
+            self._local.ro_conn = conn
+        return conn
 
     def get_query(self, query, parameters=None):
         """
@@ -41,30 +254,65 @@ class DatabaseManager:
                  
         示例:
             # 獲取所有代幣
-            tokens = db_manager.get_query("SELECT * FROM tokens")
+            tokens = db_manager.get_query("SELECT ContractAddress, TokenName, Symbol FROM tokens")
             
             # 使用參數化查詢獲取特定地址的代幣
-            token = db_manager.get_query("SELECT * FROM tokens WHERE ContractAddress = ?", 
+            token = db_manager.get_query("SELECT TokenName, Symbol FROM tokens WHERE ContractAddress = ?", 
                                         ("0x123abc...",))
         """
         try:
-            # 連接到數據庫
-            with sqlite3.connect(self.db_path) as connection:
-                cursor = connection.cursor()
-                # 如果提供了參數，使用參數執行查詢（防止SQL注入）
-                if parameters:
-                    cursor.execute(query, parameters)
-                else:
-                    cursor.execute(query)
-                # 獲取查詢的所有結果
-                results = cursor.fetchall()
-                return results
+            # 經本線程的只讀連接執行查詢，不與寫入者搶互斥鎖；
+            # 加大arraysize攤薄每行跨越Python/C邊界的開銷
+            cursor = self.get_ro_connection().cursor()
+            cursor.arraysize = 1000
+            # 如果提供了參數，使用參數執行查詢（防止SQL注入）
+            if parameters:
+                cursor.execute(query, parameters)
+            else:
+                cursor.execute(query)
+            # 獲取查詢的所有結果
+            results = cursor.fetchall()
+            return results
         except sqlite3.Error as e:
             # 若發生錯誤，打印錯誤信息並返回None
             print(f"數據庫查詢錯誤: {e}")
             return None
 
         
+    def iter_query(self, query, parameters=None, arraysize=1000):
+        """
+        以迭代器方式執行SELECT查詢，分批流式返回結果。
+
+        與get_query不同，此方法不會把整個結果集一次性載入內存
+        （對百萬行級的tokens表做fetchall會佔用O(N)內存），
+        而是每次只從SQLite取arraysize行，峰值內存為O(批大小)。
+
+        參數:
+            query (str): 要執行的SQL查詢語句，通常是SELECT語句。
+            parameters (tuple, optional): 參數化查詢的參數，用於防止SQL注入攻擊。
+            arraysize (int, optional): 每批從數據庫取回的行數，默認1000。
+
+        返回:
+            generator: 逐行產出結果元組的生成器。
+
+        示例:
+            for row in db_manager.iter_query("SELECT ContractAddress, TokenName FROM tokens"):
+                process(row)
+        """
+        # 經本線程的只讀連接流式讀取，游標的生命週期不佔用寫入者的互斥鎖
+        cursor = self.get_ro_connection().cursor()
+        cursor.arraysize = arraysize
+        if parameters:
+            cursor.execute(query, parameters)
+        else:
+            cursor.execute(query)
+
+        while True:
+            batch = cursor.fetchmany(arraysize)
+            if not batch:
+                break
+            yield from batch
+
     def execute_query(self, query, parameters=None):
         """
         執行SQL更新查詢（如INSERT、UPDATE、DELETE、CREATE TABLE等）。
@@ -93,20 +341,75 @@ class DatabaseManager:
             )
         """
         try:
-            # 連接到數據庫
-            with sqlite3.connect(self.db_path) as connection:
-                cursor = connection.cursor()
+            # 複用長駐連接執行更新
+            with self._lock:
+                cursor = self._conn.cursor()
                 # 如果提供了參數，使用參數執行查詢（防止SQL注入）
                 if parameters:
                     cursor.execute(query, parameters)
                 else:
                     cursor.execute(query)
                 # 提交事務，使更改永久生效
-                connection.commit()
+                self._conn.commit()
         except sqlite3.Error as e:
             # 若發生錯誤，打印錯誤信息
             print(f"數據庫執行錯誤: {e}")
 
+    def get_source_code(self, contract_address):
+        """
+        讀取指定合約的源碼，透明處理壓縮與明文兩種存儲格式。
+
+        新寫入的行將源碼以zstd壓縮存於SourceCodeZstd，
+        歷史行仍以明文存於SourceCode；此方法對調用者屏蔽差異。
+
+        參數:
+            contract_address (str): 合約地址。
+
+        返回:
+            str: 合約源碼；合約不存在或無源碼時返回None。
+        """
+        row = self.get_query(
+            "SELECT SourceCode, SourceCodeZstd FROM contracts WHERE ContractAddress = ?",
+            (contract_address,)
+        )
+        if not row:
+            return None
+        source_code, source_code_zstd = row[0]
+        if source_code_zstd is not None:
+            return self._ZSTD_DECOMPRESSOR.decompress(source_code_zstd).decode("utf-8")
+        return source_code
+
+    def close(self):
+        """
+        關閉長駐數據庫連接。
+
+        通常在程序退出前調用；關閉後此管理器不可再使用。
+        （其他線程的只讀連接隨其線程結束由垃圾回收釋放。）
+        """
+        ro_conn = getattr(self._local, "ro_conn", None)
+        if ro_conn is not None:
+            ro_conn.close()
+            self._local.ro_conn = None
+        with self._lock:
+            self._conn.close()
+
+    def _validate_identifier(self, name):
+        """
+        校驗動態拼接進SQL的表名/列名是否為合法標識符。
+
+        參數:
+            name (str): 要校驗的表名或列名。
+
+        返回:
+            str: 校驗通過時原樣返回name。
+
+        拋出:
+            ValueError: 當name含有標識符以外的字符時。
+        """
+        if not self._IDENTIFIER_RE.match(name):
+            raise ValueError(f"非法的SQL標識符: {name!r}")
+        return name
+
     def drop_table(self, table_name):
         """
         從數據庫中刪除指定表格。
@@ -122,7 +425,7 @@ class DatabaseManager:
         警告:
             此操作會永久刪除表格及其所有數據，不可恢復。
         """
-        self.execute_query(f"DROP TABLE IF EXISTS {table_name}")
+        self.execute_query(f"DROP TABLE IF EXISTS {self._validate_identifier(table_name)}")
         print(f"表格 '{table_name}' 已刪除（如果存在）。")
 
     def delete_records(self, table_name):
@@ -140,7 +443,7 @@ class DatabaseManager:
         警告:
             此操作會永久刪除表格中的所有數據，但保留表結構。
         """
-        self.execute_query(f"DELETE FROM {table_name}")
+        self.execute_query(f"DELETE FROM {self._validate_identifier(table_name)}")
         print(f"已刪除表格 '{table_name}' 中的所有記錄。")
 
     def create_table(self, table_name, schema):
@@ -163,7 +466,7 @@ class DatabaseManager:
                 "address TEXT PRIMARY KEY, name TEXT NOT NULL, supply INTEGER"
             )
         """
-        self.execute_query(f"CREATE TABLE IF NOT EXISTS {table_name} ({schema})")
+        self.execute_query(f"CREATE TABLE IF NOT EXISTS {self._validate_identifier(table_name)} ({schema})")
         print(f"表格 '{table_name}' 已創建。")
 
     def create_tokens_table(self):
@@ -181,49 +484,7 @@ class DatabaseManager:
             - 主鍵: ContractAddress (代幣合約地址)
             - 包含代幣基本信息、社交媒體、安全屬性等多種數據
         """
-        schema = """
-            ContractAddress TEXT PRIMARY KEY,   -- 代幣的唯一識別符（智能合約地址）
-            pairAddress TEXT,          -- 代幣交易對地址（用於DEX流動性池）
-            Owner TEXT ,                -- 代幣合約擁有者地址
-            Creator TEXT,              -- 代幣合約創建者地址
-            TokenName TEXT NOT NULL,            -- 代幣名稱
-            Symbol TEXT NOT NULL,               -- 代幣符號（如ETH、BTC）
-            TotalSupply INTEGER,       -- 代幣總供應量
-            Decimal INTEGER,           -- 代幣小數位數
-            CreatedBlock INTEGER,     -- 代幣創建時的區塊號
-            TwitterUrl TEXT,                -- 代幣的Twitter（X）頁面URL
-            WebsiteUrl TEXT,                -- 代幣的官方網站URL
-            TwitterUser TEXT,              -- 代幣的Twitter用戶名
-            TelegramUrl TEXT,               -- 代幣的Telegram頻道URL
-            WhitepaperUrl TEXT,             -- 代幣白皮書URL
-            isScam TEXT,                    -- 指示代幣是否為詐騙幣（true/false）
-            isPotentialSpam TEXT,           -- 指示代幣是否為潛在垃圾幣（true/false）
-            safetyLevel TEXT,               -- 代幣的安全級別評估
-            spamCode INT,                   -- 垃圾幣類型的編碼
-            attackTypes TEXT,               -- 與代幣相關的攻擊類型（多個類型以逗號分隔）
-            is_open_source TEXT,            -- 指示代幣合約是否開源（true/false）
-            is_honeypot TEXT,               -- 指示代幣是否為蜜罐（無法賣出的騙局）（true/false）
-            is_mintable TEXT,                -- 指示代幣是否可鑄造（增發）（true/false）
-            is_proxy TEXT,                  -- 指示代幣是否為代理合約（true/false）
-            slippage_modifiable TEXT,       -- 指示代幣是否可修改滑點（true/false）
-            is_blacklisted TEXT,            -- 指示代幣是否具有黑名單功能（true/false）
-            min_sell_tax FLOAT,             -- 代幣的最低賣出稅率（百分比）
-            max_sell_tax FLOAT,             -- 代幣的最高賣出稅率（百分比）
-            min_buy_tax FLOAT,              -- 代幣的最低買入稅率（百分比）
-            max_buy_tax FLOAT,              -- 代幣的最高買入稅率（百分比）
-            is_contract_renounced TEXT,     -- 指示合約所有權是否已放棄（true/false）
-            is_potentially_scam TEXT,       -- 指示代幣是否為潛在詐騙（true/false）
-            transfer_pausable TEXT,         -- 指示代幣轉賬功能是否可暫停（true/false）
-            warnings TEXT,                   -- 與代幣相關的警告信息
-            FetchedAt TEXT,                 -- 獲取代幣數據的時間戳
-            creationTime TEXT,              -- 代幣創建時間
-            firstSwapTimestamp TEXT,        -- 代幣首次交易時間戳
-            locksCreatedAt TEXT,            -- 代幣流動性鎖定創建時間
-            creatorAddress TEXT,              
-            smart_contract_verified INT,   
-            twitter_verified INT         
-        """
-        self.create_table("tokens", schema)
+        self.create_table("tokens", self._TOKENS_SCHEMA)
 
     def create_contracts_table(self):
         """
@@ -239,21 +500,7 @@ class DatabaseManager:
             - 主鍵: ContractAddress (合約地址)
             - 包含源代碼、編譯器版本、優化設置等信息
         """
-        schema = """
-            ContractAddress TEXT PRIMARY KEY,    -- 智能合約地址，作為唯一識別符
-            SourceCode TEXT,                     -- 合約源代碼（可能是多個文件的JSON格式）
-            CompilerVersion TEXT,                -- 編譯合約所用的Solidity編譯器版本
-            OptimizationUsed TEXT,               -- 是否使用了編譯優化（"1"表示是，"0"表示否）
-            Runs TEXT,                           -- 優化運行次數設置
-            EVMVersion TEXT,                     -- 目標EVM（以太坊虛擬機）版本
-            Library TEXT,                        -- 合約使用的外部庫
-            LicenseType TEXT,                    -- 合約源代碼的許可證類型（如MIT、GPL等）
-            Proxy TEXT,                          -- 是否為代理合約
-            Implementation TEXT,                 -- 若為代理合約，其實現合約的地址
-            SwarmSource TEXT,                    -- SWARM源（分布式存儲中的源代碼引用）
-            FetchedAt TEXT                       -- 獲取合約數據的時間戳
-        """
-        self.create_table("contracts", schema)
+        self.create_table("contracts", self._CONTRACTS_SCHEMA)
 
     def create_tweets_table(self):
         """
@@ -269,20 +516,7 @@ class DatabaseManager:
             - 主鍵: tweet_id (推文唯一ID)
             - 包含推文內容、互動統計、用戶信息等
         """
-        schema = """
-            user_id TEXT NOT NULL,               -- 發布推文的用戶ID
-            tweet_id TEXT PRIMARY KEY,           -- 推文的唯一識別符
-            tweet_full_text TEXT,                -- 推文的完整文本內容
-            tweet_favorite_count INTEGER,        -- 推文獲得的點讚數
-            tweet_view_count INTEGER,            -- 推文的瀏覽次數
-            tweet_quote_count INTEGER,           -- 推文的引用次數
-            tweet_reply_count INTEGER,           -- 推文的回覆數
-            tweet_retweet_count INTEGER,         -- 推文的轉發數
-            tweet_created_at TEXT,               -- 推文的創建時間
-            user_name TEXT,                      -- 發布推文的用戶名
-            tweet_mention_list TEXT              -- 推文中提及的用戶列表（JSON格式）
-        """
-        self.create_table("tweets", schema)
+        self.create_table("tweets", self._TWEETS_SCHEMA)
 
     def create_twitter_users_table(self):
         """
@@ -299,15 +533,7 @@ class DatabaseManager:
             - 主鍵: username (Twitter用戶名)
             - 包含用戶基本信息及狀態
         """
-        schema = '''
-                user_id TEXT NOT NULL,                  -- Twitter用戶的數字ID
-                username TEXT PRIMARY KEY,        -- Twitter用戶名（主鍵，唯一識別符）
-                description TEXT,                 -- 用戶的個人簡介
-                created_time TEXT,                -- 用戶賬號創建時間
-                available TEXT                    -- 用戶賬號是否可用（"true"/"false"）
-                
-            '''
-        self.create_table("twitter_users", schema)
+        self.create_table("twitter_users", self._TWITTER_USERS_SCHEMA)
 
     def create_owner_txn_table(self):
         """
@@ -325,31 +551,94 @@ class DatabaseManager:
             - 主鍵: hash (交易哈希值)
             - 包含交易的完整區塊鏈記錄
         """
-        schema = '''
-                owner TEXT NOT NULL,              -- 交易關聯的代幣擁有者地址
-                blockNumber INT,                  -- 包含此交易的區塊號
-                blockHash TEXT,                   -- 包含此交易的區塊哈希值
-                timeStamp INT,                    -- 交易的時間戳（Unix時間格式）
-                hash TEXT PRIMARY KEY,            -- 交易的唯一哈希值（主鍵）
-                nonce INT,                        -- 交易發送者的nonce值（交易計數器）
-                transactionIndex INT,             -- 交易在區塊中的索引位置
-                fromAddress TEXT,                 -- 交易發送方的地址
-                toAddress TEXT,                   -- 交易接收方的地址
-                value INT,                        -- 交易中轉移的以太幣/代幣數量（以wei為單位）
-                gas INT,                          -- 交易的燃料限制
-                gasPrice INT,                     -- 交易的燃料價格（以wei為單位）
-                input TEXT,                       -- 交易的輸入數據（智能合約調用數據）
-                methodId TEXT,                    -- 調用的合約方法ID（函數選擇器）
-                functionName TEXT,                -- 調用的合約函數名稱
-                contractAddress TEXT,             -- 相關智能合約的地址
-                cumulativeGasUsed INT,            -- 交易執行時的累計燃料使用量
-                gasUsed INT,                      -- 此交易消耗的燃料量
-                confirmations INT,                -- 交易確認數
-                isError TEXT                      -- 交易執行是否出錯（"0"表示成功，"1"表示失敗）
-            '''
-        self.create_table("owner_txn", schema)
+        self.create_table("owner_txn", self._OWNER_TXN_SCHEMA)
+
 
 
+    def _migrate_columns(self, cursor):
+        """
+        為舊數據庫補上索引謂詞所需的新列。
+
+        CREATE TABLE IF NOT EXISTS不會為既有表格添加新列，
+        因此在建立引用這些列的索引之前，先按PRAGMA table_info
+        檢查並ALTER TABLE補齊（列已存在或表格不存在時跳過）。
+
+        參數:
+            cursor: 用於執行遷移DDL的數據庫游標。
+        """
+        for table_name, column_name, column_type in self._COLUMN_MIGRATIONS:
+            columns = [row[1] for row in cursor.execute(
+                f"PRAGMA table_info({table_name})")]
+            if columns and column_name not in columns:
+                cursor.execute(
+                    f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}")
+
+    def create_indexes(self):
+        """
+        創建查詢熱路徑所需的索引。
+
+        目前包含：
+        - tokens表上的(contractAddress, smart_contract_verified)
+          覆蓋索引，使分類器查找未驗證合約的反連接查詢
+          從全表掃描變為索引查找。
+        - contracts表上只覆蓋缺少源碼行的部分索引，使爬蟲每4分鐘
+          的缺源碼掃描從全表掃描變為只讀少數幾行的索引掃描；
+          絕大多數插入都帶有源碼，維護成本接近於零。
+        - tokens表上只覆蓋社交字段尚有空缺行的部分索引，
+          社交媒體提取器每輪的JOIN過濾隨字段填滿而越掃越少。
+        - tokens表上的TwitterUser索引，推文分類器按用戶名回寫
+          驗證結果的UPDATE由全表掃描變為索引查找。
+
+        返回:
+            無返回值，索引已存在時不會重複創建。
+        """
+        try:
+            with self._lock:
+                self._migrate_columns(self._conn.cursor())
+                self._conn.commit()
+        except sqlite3.Error as e:
+            print(f"數據庫執行錯誤: {e}")
+        for ddl in self._INDEX_DDL:
+            self.execute_query(ddl)
+        print("查詢索引已創建。")
+
+    def bootstrap_schema(self):
+        """
+        在單一事務內創建全部表格與索引。
+
+        逐個調用create_*_table會讓每條DDL各自開啟並提交一個事務；
+        此方法用一個BEGIN IMMEDIATE包住所有DDL，啟動更快，
+        且併發讀取者不會觀察到只建了一半的表結構。
+
+        返回:
+            無返回值，但會打印操作結果信息。
+        """
+        tables = {
+            "tokens": self._TOKENS_SCHEMA,
+            "contracts": self._CONTRACTS_SCHEMA,
+            "tweets": self._TWEETS_SCHEMA,
+            "twitter_users": self._TWITTER_USERS_SCHEMA,
+            "owner_txn": self._OWNER_TXN_SCHEMA,
+        }
+        try:
+            with self._lock:
+                cursor = self._conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                try:
+                    for table_name, schema in tables.items():
+                        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({schema})")
+                    # 舊庫可能缺少索引謂詞引用的列，先補齊再建索引，
+                    # 避免一條索引DDL失敗回滾掉整個事務
+                    self._migrate_columns(cursor)
+                    for ddl in self._INDEX_DDL:
+                        cursor.execute(ddl)
+                    self._conn.commit()
+                except sqlite3.Error:
+                    self._conn.rollback()
+                    raise
+            print("數據庫表結構已初始化。")
+        except sqlite3.Error as e:
+            print(f"數據庫執行錯誤: {e}")
 
     def add_column_to_table(self, table_name, column_name, column_type):
         """
@@ -378,5 +667,8 @@ class DatabaseManager:
                 "BOOLEAN DEFAULT 0"
             )
         """
-        self.execute_query(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}")
+        self.execute_query(
+            f"ALTER TABLE {self._validate_identifier(table_name)} "
+            f"ADD COLUMN {self._validate_identifier(column_name)} {column_type}"
+        )
         print(f"已向表格 '{table_name}' 添加列 '{column_name}'。")
\ No newline at end of file
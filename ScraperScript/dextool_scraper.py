@@ -16,16 +16,55 @@
 #    - 安全風險警告 (Warnings)
 # ########################################################################################
 import re
-import requests
+import asyncio
+import functools
+import aiohttp
+from aiolimiter import AsyncLimiter
 from config import *
 import sqlite3
 import logging
 from web3 import Web3
+from eth_abi import decode as abi_decode
 from datetime import datetime
 
 from config import DB_PATH, INFURA_API_KEY, ERC20_ABI, FACTORY_ADDRESS, FACTORY_ABI, DEXTOOL_COOKIES, DEXTOOL_HEADERS
 import time
 
+# 同時向 Dextools 發出的請求上限, 避免觸發其速率限制
+MAX_CONCURRENT_FETCHES = 20
+
+# 令牌桶速率: 每秒最多發出的 Dextools 請求數, 讓吞吐貼近而不超過限額
+DEXTOOL_MAX_QPS = 5
+
+# 單個請求遇到 429 時的最大重試次數
+MAX_FETCH_RETRIES = 3
+
+# WETH 主網地址, 所有交易對都以它為另一側代幣
+WETH_ADDRESS = "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"
+
+# Multicall3 聚合合約: 把多個eth_call打包成一次RPC (主網固定地址)
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MULTICALL3_ABI = [{
+    "name": "aggregate3",
+    "type": "function",
+    "stateMutability": "payable",
+    "inputs": [{"name": "calls", "type": "tuple[]", "components": [
+        {"name": "target", "type": "address"},
+        {"name": "allowFailure", "type": "bool"},
+        {"name": "callData", "type": "bytes"},
+    ]}],
+    "outputs": [{"name": "returnData", "type": "tuple[]", "components": [
+        {"name": "success", "type": "bool"},
+        {"name": "returnData", "type": "bytes"},
+    ]}],
+}]
+
+# 每次 Multicall3 打包的 getPair 調用數量
+PAIR_MULTICALL_CHUNK = 500
+
+# 從 Twitter URL 中提取用戶名 (預編譯)
+_TWITTER_USER_RE = re.compile(r"^https:\/\/(?:x\.com|twitter\.com)\/([a-zA-Z0-9_]+)$")
+
 
 class DextoolScraper:
     """
@@ -60,6 +99,41 @@ class DextoolScraper:
         self.db_path = db_path
         self.erc20_abi = erc20_abi
 
+        # 工廠與Multicall3合約只構建一次: getPair批量打包成單次eth_call
+        self.factory_contract = self.web3.eth.contract(address=FACTORY_ADDRESS, abi=FACTORY_ABI)
+        self.multicall = self.web3.eth.contract(address=MULTICALL3_ADDRESS, abi=MULTICALL3_ABI)
+        # WETH 的 checksum 形式只算一次
+        self.weth = Web3.to_checksum_address(WETH_ADDRESS)
+
+        # 長駐數據庫連接: 每個代幣開關一次連接的成本(~1ms)比UPDATE
+        # 本身還貴; WAL+synchronous=NORMAL減少每次提交的fsync
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+        # 長駐事件循環與HTTP會話: 連接池跨越每5分鐘的爬取週期存活,
+        # 同一週期內的請求復用keep-alive連接, 省去每次TCP+TLS握手
+        self._loop = asyncio.new_event_loop()
+        self._session = None
+
+        # 令牌桶限速器: 突發請求被平滑成穩定的QPS, 而不是一口氣
+        # 打滿併發數觸發429
+        self._rate_limiter = AsyncLimiter(DEXTOOL_MAX_QPS, 1)
+
+    async def _get_session(self):
+        """
+        返回共享的 aiohttp 會話, 首次調用時建立
+
+        返回:
+            綁定在長駐事件循環上的 aiohttp.ClientSession
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=50, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  cookies=DEXTOOL_COOKIES,
+                                                  headers=DEXTOOL_HEADERS)
+        return self._session
+
     def get_address_from_db(self):
         """
         從資料庫獲取尚未審計的代幣合約地址
@@ -68,27 +142,26 @@ class DextoolScraper:
             address: 合約地址列表
         """
         logging.info("Fetching addresses from database")
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
         cursor.execute("""
-                SELECT ContractAddress FROM tokens WHERE creatorAddress IS NULL;                
+                SELECT ContractAddress FROM tokens WHERE creatorAddress IS NULL;
             """)
 
         address = cursor.fetchall()
-        conn.close()
         address = [c[0] for c in address]
         logging.info(f"Found {len(address)} addresses to process")
         return address
 
    
-    def process_dextool_data(self,contractAddress, result):
+    def process_dextool_data(self,contractAddress, result, pair_address):
         """
         處理從 Dextools 獲取的代幣數據，並提取相關的安全資訊
-        
+
         參數:
             contractAddress: 代幣合約地址
             result: 從 Dextools 獲取的代幣數據
-            
+            pair_address: 已解析的交易對地址 (調用方提供, 避免重複RPC)
+
         返回:
             提取的代幣安全資訊元組
         """
@@ -116,7 +189,6 @@ class DextoolScraper:
         is_potentially_scam = audit['is_potentially_scam']      
         transfer_pausable = audit['transfer_pausable']        # Can detect when launch
         warnings = audit['summary']['providers']['warning']
-        pair_address = self.get_pair_address('0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2', contractAddress)
         if locksCreatedAt == []:
             locksCreatedAt = None
         if len(warnings) > 0:
@@ -159,91 +231,181 @@ class DextoolScraper:
 
         logging.info(f"Updating database for address: {address} , pair address: {pair_address}")
         logging.info(f"Creation Time: {creationTime}, First Swap Timestamp: {firstSwapTimestamp}, Locks Created At: {locksCreatedAt}, Creator Address: {creatorAddress}")
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # 空字符串視為缺失: 經COALESCE落回原列, 不覆蓋已有的社交字段
+        TwitterUrl = TwitterUrl or None
+        WebsiteUrl = WebsiteUrl or None
+        TelegramUrl = TelegramUrl or None
+        twitter_user = None
+        if TwitterUrl:
+            twitter_user_match = _TWITTER_USER_RE.search(TwitterUrl)
+            if twitter_user_match:
+                twitter_user = twitter_user_match.group(1)
+
         try:
-            if TwitterUrl !=  '':
-                twitter_user = re.search(r"^https:\/\/(?:x\.com|twitter\.com)\/([a-zA-Z0-9_]+)$", TwitterUrl)
-                if twitter_user:
-                    twitter_user = twitter_user.group(1)  
-                    cursor.execute("""
-                        UPDATE tokens SET TwitterUrl = ?, TwitterUser = ? WHERE ContractAddress = ?;
-                    """, (TwitterUrl,twitter_user, address))
-                    conn.commit()
-
-            if WebsiteUrl !=  '':
-                cursor.execute("""
-                    UPDATE tokens SET WebsiteUrl = ? WHERE ContractAddress = ?;
-                """, (WebsiteUrl, address))
-                conn.commit()
-            if  TelegramUrl != '':
-                cursor.execute("""
-                    UPDATE tokens SET TelegramUrl = ? WHERE ContractAddress = ?;
-                """, (TelegramUrl, address))
-                conn.commit()
-
-            cursor.execute("""
-                    UPDATE tokens SET creationTime = ?, firstSwapTimestamp = ? , locksCreatedAt = ?, creatorAddress = ?, pairAddress = ?, TwitterUrl = ?, WebsiteUrl = ?, TelegramUrl = ?, is_open_source = ?, is_honeypot = ?, is_mintable = ?,  is_proxy = ?, slippage_modifiable = ?, is_blacklisted = ?, min_sell_tax = ?, max_sell_tax = ?, min_buy_tax = ?,  max_buy_tax = ?, is_contract_renounced = ?, is_potentially_scam = ?, transfer_pausable = ?, warnings = ?  WHERE ContractAddress = ?;
-                """, (creationTime, firstSwapTimestamp, locksCreatedAt, creatorAddress, pair_address, TwitterUrl, WebsiteUrl, TelegramUrl, is_open_source, is_honeypot, is_mintable, is_proxy, slippage_modifiable, is_blacklisted, min_sell_tax, max_sell_tax, min_buy_tax, max_buy_tax, is_contract_renounced, is_potentially_scam, transfer_pausable, warnings, address))
-            conn.commit()
+            # 四條UPDATE+四次commit合併為一條: 每個代幣只付一次fsync
+            with self.conn:
+                self.conn.execute("""
+                    UPDATE tokens SET creationTime = ?, firstSwapTimestamp = ? , locksCreatedAt = ?, creatorAddress = ?, pairAddress = ?, TwitterUrl = COALESCE(?, TwitterUrl), TwitterUser = COALESCE(?, TwitterUser), WebsiteUrl = COALESCE(?, WebsiteUrl), TelegramUrl = COALESCE(?, TelegramUrl), is_open_source = ?, is_honeypot = ?, is_mintable = ?,  is_proxy = ?, slippage_modifiable = ?, is_blacklisted = ?, min_sell_tax = ?, max_sell_tax = ?, min_buy_tax = ?,  max_buy_tax = ?, is_contract_renounced = ?, is_potentially_scam = ?, transfer_pausable = ?, warnings = ?  WHERE ContractAddress = ?;
+                """, (creationTime, firstSwapTimestamp, locksCreatedAt, creatorAddress, pair_address, TwitterUrl, twitter_user, WebsiteUrl, TelegramUrl, is_open_source, is_honeypot, is_mintable, is_proxy, slippage_modifiable, is_blacklisted, min_sell_tax, max_sell_tax, min_buy_tax, max_buy_tax, is_contract_renounced, is_potentially_scam, transfer_pausable, warnings, address))
             logging.info("Database update successful")
         except Exception as e:
             logging.error(f"Error updating database: {str(e)}")
-        finally:
-            conn.close()
 
 
+    @functools.lru_cache(maxsize=4096)
     def get_pair_address(self, token0, token1):
         """
         根據 Uniswap V2 工廠合約獲取交易對地址
-        
+
+        交易對地址一旦創建就不會變, 結果以LRU緩存, 同一代幣
+        重複查詢不再付出eth_call往返
+
         參數:
             token0: 代幣0地址
             token1: 代幣1地址
-            
+
         返回:
             pair_address: 交易對合約地址
         """
-        factory_contract = self.web3.eth.contract(address=FACTORY_ADDRESS, abi=FACTORY_ABI)
         # 確保地址為 checksum 格式
         token0 = self.web3.to_checksum_address(token0)
         token1 = self.web3.to_checksum_address(token1)
-        
+
         # 調用 getPair 函數
-        pair_address = factory_contract.functions.getPair(token0, token1).call()
+        pair_address = self.factory_contract.functions.getPair(token0, token1).call()
         return pair_address
-        
+
+    def resolve_pair_addresses(self, address_list):
+        """
+        以 Multicall3 批量解析一批代幣的交易對地址
+
+        逐代幣的 getPair 是每個代幣一次eth_call往返; 打包成
+        Multicall3 的 aggregate3 後, 每 PAIR_MULTICALL_CHUNK 個
+        代幣只付一次RPC
+
+        參數:
+            address_list: 代幣合約地址列表
+
+        返回:
+            {代幣地址: 交易對地址} 字典 (不含解析失敗或尚無交易對的代幣)
+        """
+        resolved = {}
+        for chunk_start in range(0, len(address_list), PAIR_MULTICALL_CHUNK):
+            chunk = address_list[chunk_start:chunk_start + PAIR_MULTICALL_CHUNK]
+            try:
+                calls = [
+                    (FACTORY_ADDRESS, True,
+                     self.factory_contract.encode_abi("getPair",
+                                                      args=[self.weth, self.web3.to_checksum_address(address)]))
+                    for address in chunk
+                ]
+                results = self.multicall.functions.aggregate3(calls).call()
+            except Exception as e:
+                logging.error(f"Error resolving pair addresses for chunk at {chunk_start}: {e}")
+                continue
+            for address, (success, return_data) in zip(chunk, results):
+                if not success or not return_data:
+                    continue
+                pair_address = self.web3.to_checksum_address(abi_decode(["address"], return_data)[0])
+                if pair_address == "0x0000000000000000000000000000000000000000":
+                    # 還沒有交易對, 跳過
+                    continue
+                resolved[address] = pair_address
+        return resolved
+
+    async def _fetch_pair_data(self, session, semaphore, contractAddress, pair_address):
+        """
+        異步獲取單個交易對的 Dextools 數據
+
+        參數:
+            session: 共享的 aiohttp 會話
+            semaphore: 限制並發請求數的信號量
+            contractAddress: 代幣合約地址
+            pair_address: 交易對合約地址
+
+        返回:
+            (contractAddress, 響應JSON) 元組
+        """
+        params = {
+            'address': pair_address.lower(),
+            'chain': 'ether',
+            'audit': 'true',
+        }
+        backoff = 1
+        for attempt in range(MAX_FETCH_RETRIES):
+            async with semaphore:
+                # 令牌桶限速: 每個請求先取得令牌再發出
+                async with self._rate_limiter:
+                    async with session.get('https://www.dextools.io/shared/data/pair', params=params) as response:
+                        if response.status == 429:
+                            # 優先遵守服務端的Retry-After, 否則指數退避;
+                            # 只延後這一個請求, 不再全局睡5分鐘
+                            try:
+                                retry_after = float(response.headers.get("Retry-After", backoff))
+                            except ValueError:
+                                retry_after = backoff
+                            logging.warning(f"Rate limited fetching {contractAddress}, retrying in {retry_after}s")
+                            await asyncio.sleep(max(retry_after, backoff))
+                            backoff *= 2
+                            continue
+                        return contractAddress, await response.json()
+        raise RuntimeError(f"Rate limited after {MAX_FETCH_RETRIES} attempts for {contractAddress}")
+
+    async def _fetch_all_pairs(self, pairs):
+        """
+        並發獲取一批交易對的 Dextools 數據
+
+        每個代幣的抓取是獨立的網絡等待, 串行循環浪費牆鐘時間;
+        用同一個keep-alive連接池併發抓取, 信號量限制並發數
+
+        參數:
+            pairs: (contractAddress, pair_address) 元組列表
+
+        返回:
+            _fetch_pair_data 結果列表 (失敗的項為異常對象)
+        """
+        semaphore = asyncio.BoundedSemaphore(MAX_CONCURRENT_FETCHES)
+        session = await self._get_session()
+        tasks = [
+            self._fetch_pair_data(session, semaphore, contractAddress, pair_address)
+            for contractAddress, pair_address in pairs
+        ]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
     def scrape_info(self):
         """
         爬取代幣資訊主程式
-        
-        從資料庫獲取代幣地址後,
-        依序檢查每個代幣的安全資訊並更新至資料庫
+
+        從資料庫獲取代幣地址後, 先同步解析各代幣的交易對地址,
+        再併發抓取 Dextools 數據, 最後逐一處理並更新至資料庫
         """
         address_list = self.get_address_from_db()
-        
-        
-        for contractAddress in address_list:
-            
+
+        # Multicall3批量解析交易對地址, 過濾掉還沒有交易對的代幣
+        pairs = []
+        for contractAddress, pair_address in self.resolve_pair_addresses(address_list).items():
+            logging.info(f"Processing token at {contractAddress} with pair address {pair_address}")
+            pairs.append((contractAddress, pair_address))
+
+        if not pairs:
+            return
+
+        # 併發抓取所有交易對的數據 (復用長駐事件循環, 會話得以跨週期存活)
+        fetched = self._loop.run_until_complete(self._fetch_all_pairs(pairs))
+
+        for (contractAddress, pair_address), item in zip(pairs, fetched):
+            if isinstance(item, Exception):
+                logging.error(f"Error fetching token at {contractAddress}: {item}")
+                continue
             try:
-                pair_address = self.get_pair_address('0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2', contractAddress)
-                if pair_address == "0x0000000000000000000000000000000000000000":
-                    continue
-                logging.info(f"Processing token at {contractAddress} with pair address {pair_address}")
-
-                params = {
-                'address':  pair_address.lower(),
-                'chain': 'ether',
-                'audit': 'true',
-                }
-                result = requests.get('https://www.dextools.io/shared/data/pair', params=params, cookies=DEXTOOL_COOKIES, headers=DEXTOOL_HEADERS).json()
+                _, result = item
                 logging.info(f"Fetched data for {contractAddress} from Dextools")
                 logging.info(f"Result: {result}")
                 result = result['data'][0]
-                
-                
-            
-                creationTime, firstSwapTimestamp, locksCreatedAt, creatorAddress, pair_address, TwitterUrl, WebsiteUrl, TelegramUrl, is_open_source, is_honeypot, is_mintable, is_proxy, slippage_modifiable, is_blacklisted, min_sell_tax, max_sell_tax, min_buy_tax, max_buy_tax, is_contract_renounced, is_potentially_scam, transfer_pausable, warnings = self.process_dextool_data(contractAddress, result)   
+
+
+
+                creationTime, firstSwapTimestamp, locksCreatedAt, creatorAddress, pair_address, TwitterUrl, WebsiteUrl, TelegramUrl, is_open_source, is_honeypot, is_mintable, is_proxy, slippage_modifiable, is_blacklisted, min_sell_tax, max_sell_tax, min_buy_tax, max_buy_tax, is_contract_renounced, is_potentially_scam, transfer_pausable, warnings = self.process_dextool_data(contractAddress, result, pair_address)
 
                 self.update_dextool_info( creationTime, firstSwapTimestamp, locksCreatedAt, creatorAddress, contractAddress,pair_address,  TwitterUrl, WebsiteUrl, TelegramUrl, is_open_source, is_honeypot, is_mintable, is_proxy, slippage_modifiable, is_blacklisted, min_sell_tax, max_sell_tax, min_buy_tax, max_buy_tax, is_contract_renounced, is_potentially_scam, transfer_pausable, warnings)
             except Exception as e:
@@ -259,13 +421,18 @@ class DextoolScraper:
 
 if __name__ == "__main__":
     scraper = DextoolScraper(DB_PATH, INFURA_API_KEY, ERC20_ABI)
+    # 錯誤退避與成功節奏分離: 出錯後從30秒起指數退避,
+    # 而不是一律空等5分鐘
+    error_backoff = 30
     while True:
         try:
             scraper.scrape_info()
+            error_backoff = 30
             logging.info("Waiting 5 minutes before next scrape...")
             time.sleep(300)  # 300 seconds = 5 minutes
         except Exception as e:
             logging.error(f"Error in main loop: {e}")
-            time.sleep(300)  # Still wait 5 minutes on error
+            time.sleep(error_backoff)
+            error_backoff = min(error_backoff * 2, 300)
 
 
@@ -20,8 +20,39 @@ import re
 import json
 import time
 import logging
+import zstandard
 from config import *
 
+# 解壓contracts_scraper以zstd壓縮存儲的合約源碼
+_zstd_decompressor = zstandard.ZstdDecompressor()
+
+# 預編譯的URL提取模式: 每個合約的熱循環裡不再重複走re模塊的
+# 模式緩存查找
+_TWITTER_RE = re.compile(r"(https?://(x\.com|twitter\.com)/[^\s\/\\]+)")  # Match Twitter URLs
+_TELEGRAM_RE = re.compile(r"(https?://t\.me/[^\s\\]+)")  # Match Telegram URLs
+_URL_RE = re.compile(r"(https?://[^\s\\]+)")  # Match any general URL
+_TWITTER_USER_RE = re.compile(r"^https:\/\/(?:x\.com|twitter\.com)\/([a-zA-Z0-9_]+)$")
+
+# 三個模式合併為一條選擇式, 對每個源碼blob只掃描一遍:
+# 選擇式按從左到右優先匹配, 命中Twitter/Telegram的URL不會再落入
+# 通用URL分組, 因此第3組天然就是"其他網站"候選
+_COMBINED_URL_RE = re.compile(
+    r"(https?://(?:x\.com|twitter\.com)/[^\s\/\\]+)"
+    r"|(https?://t\.me/[^\s\\]+)"
+    r"|(https?://[^\s\\]+)"
+)
+
+# 名人/平台官方帳號黑名單: 合約源碼裡掛這些帳號的不是項目自己的
+# Twitter。用戶名走O(1)集合查找, URL走單條選擇式正則掃描
+_BLACKLIST_USERS = frozenset({
+    "VitalikButerin", "elonmusk", "cz_binance", "cb_doge",
+    "WhiteHouse", "kanyewest", "dogecoin", "DEXToolsApp",
+})
+_BLACKLIST_URL_RE = re.compile("|".join(map(re.escape, _BLACKLIST_USERS)))
+
+# 累積多少條更新後落盤一次
+_UPDATE_FLUSH_SIZE = 1000
+
 class SocialMediaExtractor:
     """
     智能合約源碼中社交媒體鏈接提取器
@@ -47,11 +78,11 @@ class SocialMediaExtractor:
             format="%(asctime)s - %(levelname)s - %(message)s"
         )
 
-        # URL extraction regex patterns
+        # URL extraction regex patterns (precompiled at module scope)
         self.url_patterns = {
-            "twitter": r"(https?://(x\.com|twitter\.com)/[^\s\/\\]+)",  # Match Twitter URLs
-            "telegram": r"(https?://t\.me/[^\s\\]+)",  # Match Telegram URLs
-            "website": r"(https?://[^\s\\]+)",  # Match any general URL
+            "twitter": _TWITTER_RE,
+            "telegram": _TELEGRAM_RE,
+            "website": _URL_RE,
         }
 
     def clean_url(self, url):
@@ -85,6 +116,11 @@ class SocialMediaExtractor:
         返回:
             提取的源碼內容或原始源碼
         """
+        # 大多數源碼是裸Solidity而非JSON包裝: 先看首個非空白字符,
+        # 不是'{'就直接返回, 省掉必然失敗的json.loads加異常開銷
+        stripped = source_code_json.lstrip()
+        if not stripped.startswith("{"):
+            return source_code_json
         try:
             source_data = json.loads(source_code_json)
             for value in source_data.get("sources", {}).values():
@@ -104,18 +140,19 @@ class SocialMediaExtractor:
             (twitter_url, website_url, telegram_url) 元組
         """
         extracted_urls = {key: None for key in self.url_patterns}
-        all_urls = re.findall(self.url_patterns["website"], source_code)
-
-        for key, pattern in self.url_patterns.items():
-            match = re.search(pattern, source_code)
-            if match:
-                extracted_urls[key] = self.clean_url(match.group(1))
-
-        # Find the first general website URL not matching Twitter/Telegram
-        for url in all_urls:
-            clean = self.clean_url(url)
-            if clean and clean not in (extracted_urls["twitter"], extracted_urls["telegram"]):
-                extracted_urls["website"] = clean
+
+        # 單遍掃描同時匹配三類URL, 每類只保留最先出現的一個
+        for match in _COMBINED_URL_RE.finditer(source_code):
+            twitter_url, telegram_url, general_url = match.group(1, 2, 3)
+            if twitter_url and extracted_urls["twitter"] is None:
+                extracted_urls["twitter"] = self.clean_url(twitter_url)
+            elif telegram_url and extracted_urls["telegram"] is None:
+                extracted_urls["telegram"] = self.clean_url(telegram_url)
+            elif general_url and extracted_urls["website"] is None:
+                clean = self.clean_url(general_url)
+                if clean and clean not in (extracted_urls["twitter"], extracted_urls["telegram"]):
+                    extracted_urls["website"] = clean
+            if None not in extracted_urls.values():
                 break
 
         return extracted_urls["twitter"], extracted_urls["website"], extracted_urls["telegram"]
@@ -129,76 +166,87 @@ class SocialMediaExtractor:
         """
         try:
             conn = sqlite3.connect(self.db_path)
+            # WAL下讀取不阻塞寫入, synchronous=NORMAL減少每次提交的fsync
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # UPDATE走獨立的寫連接: WAL模式允許讀寫並發, 但必須是
+            # 不同的連接, 這樣SELECT游標可以保持打開邊讀邊寫
+            write_conn = sqlite3.connect(self.db_path)
+            write_conn.execute("PRAGMA journal_mode=WAL")
+            write_conn.execute("PRAGMA synchronous=NORMAL")
             cursor = conn.cursor()
+            # 一條JOIN同時取回源碼與現有社交字段: 取代每個合約一次的
+            # tokens點查詢 (N+1), 並直接跳過四個字段都已填滿的代幣,
+            # 這些行連源碼都不用解壓
             cursor.execute("""
-                SELECT ContractAddress, SourceCode 
-                FROM contracts
-                WHERE SourceCode IS NOT NULL;
-                
-            """)
-            contracts = cursor.fetchall()
-            
-
-
-            for contract_address, source_code in contracts:
-                twitter_url, website_url, telegram_url = self.extract_urls(source_code)
-
+                SELECT c.ContractAddress, c.SourceCode, c.SourceCodeZstd,
+                       t.TwitterUrl, t.TwitterUser, t.WebsiteUrl, t.TelegramUrl
+                FROM contracts c
+                JOIN tokens t ON t.ContractAddress = c.ContractAddress
+                WHERE (c.SourceCode IS NOT NULL OR c.SourceCodeZstd IS NOT NULL)
+                  AND (t.TwitterUrl IS NULL OR t.TwitterUser IS NULL
+                       OR t.WebsiteUrl IS NULL OR t.TelegramUrl IS NULL);
 
+            """)
 
-                # Fetch existing token data for comparison
-                cursor.execute("""
-                    SELECT TwitterUrl,TwitterUser, WebsiteUrl, TelegramUrl 
-                    FROM tokens
+            # 每個合約的四個字段合併為一條COALESCE更新, 累積滿一批後
+            # executemany+commit落盤: 每批只付一次fsync,
+            # 而不是每列一條UPDATE加一次commit
+            update_rows = []
+
+            def flush_updates():
+                write_conn.executemany("""
+                    UPDATE tokens
+                    SET TwitterUrl = COALESCE(?, TwitterUrl),
+                        TwitterUser = COALESCE(?, TwitterUser),
+                        WebsiteUrl = COALESCE(?, WebsiteUrl),
+                        TelegramUrl = COALESCE(?, TelegramUrl)
                     WHERE ContractAddress = ?
-                """, (contract_address,))
-                token_data = cursor.fetchone()
-
-                updates = []
-                # Skip if no token data exists
-                if token_data is None:
-                    logging.warning(f"No token data found for ContractAddress: {contract_address}")
-                    continue
-
+                """, update_rows)
+                write_conn.commit()
+                update_rows.clear()
+
+            # 直接迭代游標而非fetchall: 源碼BLOB動輒幾百KB,
+            # 全量物化會把整批源碼同時留在內存裡
+            for contract_address, source_code, source_code_zstd, *token_data in cursor:
+                # 新行的源碼以zstd壓縮存儲, 讀取時解壓
+                if source_code_zstd is not None:
+                    source_code = _zstd_decompressor.decompress(source_code_zstd).decode("utf-8")
+                twitter_url, website_url, telegram_url = self.extract_urls(source_code)
 
+                # None表示保留原值 (COALESCE落到原列)
+                twitter_value = twitter_user_value = website_value = telegram_value = None
 
                 if  token_data[0] is None and twitter_url:
-                    # if twitter_url  contains "dogecoin", "doge", "shiba", "shib", "floki" or "pepe" then skip
-                    if any(keyword in twitter_url for keyword in ["VitalikButerin", "elonmusk", "cz_binance", "cb_doge", "WhiteHouse", "kanyewest","dogecoin","DEXToolsApp"]):
-                            updates.append(("TwitterUrl", None))
-                    else:
-                        updates.append(("TwitterUrl", twitter_url))
+                    # Skip URLs pointing at blacklisted celebrity/platform accounts
+                    if not _BLACKLIST_URL_RE.search(twitter_url):
+                        twitter_value = twitter_url
 
                     print(twitter_url)
                 if token_data[1] is None and twitter_url:
-            
-                    twitter_user_match = re.search(r"^https:\/\/(?:x\.com|twitter\.com)\/([a-zA-Z0-9_]+)$", twitter_url)
+
+                    twitter_user_match = _TWITTER_USER_RE.search(twitter_url)
                     if twitter_user_match:
                         twitter_user = twitter_user_match.group(1)  # Extract username
-                        if any(keyword in twitter_user for keyword in ["VitalikButerin", "elonmusk", "cz_binance", "cb_doge", "WhiteHouse", "kanyewest","dogecoin","DEXToolsApp"]):
-                            updates.append(("TwitterUser", None))
-                        else:
-                            updates.append(("TwitterUser", twitter_user))
+                        if twitter_user not in _BLACKLIST_USERS:
+                            twitter_user_value = twitter_user
 
 
 
                 if token_data[2] is None and website_url:
-                    updates.append(("WebsiteUrl", website_url))
+                    website_value = website_url
                 if token_data[3] is None and telegram_url:
-                    updates.append(("TelegramUrl", telegram_url))
-
-                # Apply updates only if there are changes
-                for column, value in updates:
-                    # Ensure value is a valid SQLite type
-                    if not isinstance(value, (str, type(None))):
-                        raise ValueError(f"Invalid data type for column {column}: {type(value)}")
-                            
-                    cursor.execute(f"""
-                        UPDATE tokens
-                        SET {column} = ?
-                        WHERE ContractAddress = ?
-                    """, (value, contract_address))
-
-                    conn.commit()
+                    telegram_value = telegram_url
+
+                if (twitter_value, twitter_user_value, website_value, telegram_value) != (None, None, None, None):
+                    update_rows.append((twitter_value, twitter_user_value, website_value, telegram_value, contract_address))
+                    if len(update_rows) >= _UPDATE_FLUSH_SIZE:
+                        flush_updates()
+
+            if update_rows:
+                flush_updates()
+            conn.close()
+            write_conn.close()
             logging.info("Tokens table updated successfully.")
             time.sleep(60)
 
@@ -16,13 +16,64 @@
 # #######################################################################################
 
 import time
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 import sqlite3
-from web3 import Web3
+from web3 import Web3, AsyncWeb3, WebSocketProvider
+from eth_abi import decode as abi_decode
 import logging
 import schedule
 from config import *
 
+# Multicall3 聚合合約: 把多個eth_call打包成一次RPC (主網固定地址)
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MULTICALL3_ABI = [{
+    "name": "aggregate3",
+    "type": "function",
+    "stateMutability": "payable",
+    "inputs": [{"name": "calls", "type": "tuple[]", "components": [
+        {"name": "target", "type": "address"},
+        {"name": "allowFailure", "type": "bool"},
+        {"name": "callData", "type": "bytes"},
+    ]}],
+    "outputs": [{"name": "returnData", "type": "tuple[]", "components": [
+        {"name": "success", "type": "bool"},
+        {"name": "returnData", "type": "bytes"},
+    ]}],
+}]
+
+# ERC20探測調用及其返回類型, 按aggregate3的打包順序排列
+_ERC20_PROBE_CALLS = (
+    ("name", "string"),
+    ("symbol", "string"),
+    ("decimals", "uint8"),
+    ("totalSupply", "uint256"),
+    ("owner", "address"),
+)
+
+# 每個JSON-RPC批量請求打包的調用數量 (Infura的批量上限以內)
+BATCH_RPC_SIZE = 200
+
+# 去重集合的上限: 合約地址只會被創建一次, 去重只需覆蓋最近的
+# 區塊窗口; 超過上限後淘汰最舊的地址, 常駐內存保持平坦
+PROCESSED_CONTRACTS_MAX = 100_000
+
+# 逐筆收據回退路徑的並發線程數
+RECEIPT_FETCH_WORKERS = 32
+
+
+def _ws_endpoint(http_url):
+    """把 Infura 的 HTTP 端點轉換為對應的 websocket 端點"""
+    return http_url.replace("https://", "wss://").replace("/v3/", "/ws/v3/")
+
+
+def _tx_hash_hex(value):
+    """把交易哈希統一為帶0x前綴的十六進制字符串 (原始RPC與web3對象混用)"""
+    hex_value = value if isinstance(value, str) else value.hex()
+    return hex_value if hex_value.startswith("0x") else f"0x{hex_value}"
+
 
 class TokenScraper:
     """
@@ -50,34 +101,54 @@ class TokenScraper:
         
         # Initialize Web3 provider
         self.web3 = Web3(Web3.HTTPProvider(infura_api_key))
+        # 批量抓塊專用的獨立provider: batch_requests會把provider切到
+        # 批量模式, 期間同一provider上的常規請求(收據/Multicall)會拋
+        # "Cannot make a request while making a batch request";
+        # 預取線程與區塊處理併發, 必須各用各的連接
+        self._batch_web3 = Web3(Web3.HTTPProvider(infura_api_key))
+        # websocket端點: 新區塊經 newHeads 訂閱推送, 不再輪詢
+        self.ws_url = _ws_endpoint(infura_api_key)
         
         # Set database path and ABI
         self.db_path = db_path
         self.erc20_abi = erc20_abi
 
-    def check_token(self, contract_address, receipt):
+        # Multicall3合約與ERC20編碼模板: 五個元數據探測打包成一次eth_call
+        self.multicall = self.web3.eth.contract(address=MULTICALL3_ADDRESS, abi=MULTICALL3_ABI)
+        self._erc20_template = self.web3.eth.contract(abi=erc20_abi)
+
+    def check_token(self, contract_address, created_block):
         """
         檢查地址是否為 ERC20 代幣並提取其信息
-        
+
         此方法嘗試調用合約的標準 ERC20 函數(name, symbol, decimals, totalSupply, owner)
         來驗證合約是否為 ERC20 代幣並獲取基本信息
-        
+
         參數:
             contract_address: 要檢查的合約地址
-            receipt: 合約創建交易的收據
+            created_block: 合約創建交易所在的區塊號
         """
         try:
-            # Create a contract object
-            contract = self.web3.eth.contract(address=contract_address, abi=self.erc20_abi)
-
-            # Fetch token details
-            name = contract.functions.name().call()
-            symbol = contract.functions.symbol().call()
-            decimals = contract.functions.decimals().call()
-            total_supply = contract.functions.totalSupply().call() / (10 ** decimals)
-            owner = contract.functions.owner().call()
+            # 五個探測調用經Multicall3聚合為一次eth_call, 而不是五次往返;
+            # allowFailure=True讓非ERC20合約以success=False返回而非整體回退
+            calls = [
+                (contract_address, True, self._erc20_template.encode_abi(fn_name))
+                for fn_name, _ in _ERC20_PROBE_CALLS
+            ]
+            results = self.multicall.functions.aggregate3(calls).call()
+
+            decoded = []
+            for (fn_name, return_type), (success, return_data) in zip(_ERC20_PROBE_CALLS, results):
+                if not success or not return_data:
+                    # Not an ERC20 token (or missing owner()); skip without a revert round trip
+                    logging.warning(f"Contract {contract_address} skipped: {fn_name}() failed")
+                    return
+                decoded.append(abi_decode([return_type], return_data)[0])
+
+            name, symbol, decimals, total_supply, owner = decoded
+            total_supply = total_supply / (10 ** decimals)
+            owner = self.web3.to_checksum_address(owner)
             # Store the token details in the SQLite database
-            created_block = receipt.blockNumber
             logging.info(f"Token {name} ({symbol}) created in block {created_block} Owner: {owner}")
 
             fetched_at = datetime.now().isoformat()  # e.g., '2025-02-04T10:45:00'
@@ -108,36 +179,164 @@ class TokenScraper:
     def process_block(self, block, processed_contracts):
         """
         處理單個區塊,尋找合約創建交易
-        
+
+        合約地址改從單次 eth_getBlockReceipts 返回的整塊收據中查找,
+        不再對每筆創建交易單獨調用 get_transaction_receipt
+        (密集區塊中那是每塊幾十次HTTP往返)
+
         參數:
             block: Web3 區塊對象
             processed_contracts: 已處理過的合約地址集合
         """
-        for tx in block.transactions:
-            # Check if the transaction created a contract
-            if tx.to is None:  # 'to' is None for contract creation
-                try:
-                    receipt = self.web3.eth.get_transaction_receipt(tx.hash)
-                    contract_address = receipt.contractAddress
+        creation_txs = [tx for tx in block.transactions if tx.to is None]
+        if not creation_txs:
+            return
+
+        try:
+            # One RPC returns every receipt in the block
+            receipts = self.web3.manager.request_blocking("eth_getBlockReceipts", [hex(block.number)])
+            receipts_by_hash = {
+                _tx_hash_hex(receipt["transactionHash"]).lower(): receipt
+                for receipt in receipts
+            }
+        except Exception as e:
+            # 部分節點方案不支持eth_getBlockReceipts: 回退到
+            # 線程池並發的逐筆收據抓取, 而不是放棄整個區塊
+            logging.warning(f"eth_getBlockReceipts failed for block {block.number}, "
+                            f"falling back to per-tx receipts: {e}")
+            receipts_by_hash = self._fetch_receipts_parallel(creation_txs)
+            if not receipts_by_hash:
+                return
+
+        for tx in creation_txs:
+            try:
+                receipt = receipts_by_hash.get(_tx_hash_hex(tx.hash).lower())
+                if receipt is None:
+                    continue
+                contract_address = receipt["contractAddress"]
+
+                if not contract_address:
+                    continue
+                contract_address = self.web3.to_checksum_address(contract_address)
+
+                if contract_address not in processed_contracts:
+                    processed_contracts[contract_address] = None  # Mark as processed
+                    # 有界LRU: 超過上限時淘汰最舊的地址, 長期運行不漏內存
+                    if len(processed_contracts) > PROCESSED_CONTRACTS_MAX:
+                        processed_contracts.popitem(last=False)
+                    self.check_token(contract_address, block.number)  # Call the function
+            except Exception as e:
+                # Not ERC20 or some other error
+                continue
+
+
+    def _fetch_receipts_parallel(self, creation_txs):
+        """
+        線程池並發抓取一批創建交易的收據
+
+        逐筆 get_transaction_receipt 是獨立的I/O等待, 串行循環
+        把往返時間全部疊加; 並發提交後按完成順序收集
 
-                    if contract_address and contract_address not in processed_contracts:
-                        processed_contracts.add(contract_address)  # Mark as processed
-                        self.check_token(contract_address, receipt)  # Call the function
+        參數:
+            creation_txs: 合約創建交易列表
+
+        返回:
+            {交易哈希(小寫0x十六進制): 收據} 字典
+        """
+        receipts_by_hash = {}
+        with ThreadPoolExecutor(max_workers=min(RECEIPT_FETCH_WORKERS, len(creation_txs))) as pool:
+            futures = {
+                pool.submit(self.web3.eth.get_transaction_receipt, tx.hash): tx
+                for tx in creation_txs
+            }
+            for future in as_completed(futures):
+                try:
+                    receipt = future.result()
                 except Exception as e:
-                    # Not ERC20 or some other error
+                    logging.error(f"Error fetching receipt for tx "
+                                  f"{_tx_hash_hex(futures[future].hash)}: {e}")
                     continue
+                receipts_by_hash[_tx_hash_hex(receipt["transactionHash"]).lower()] = receipt
+        return receipts_by_hash
+
+    def _fetch_block_chunk(self, chunk_start, chunk_end):
+        """
+        以單個JSON-RPC批量請求抓取 [chunk_start, chunk_end] 的區塊
+
+        走獨立的_batch_web3 provider, 在工作線程上預取時不會把
+        主provider鎖進批量模式
+
+        參數:
+            chunk_start: 起始區塊號(含)
+            chunk_end: 結束區塊號(含)
+        """
+        with self._batch_web3.batch_requests() as batch:
+            for block_num in range(chunk_start, chunk_end + 1):
+                batch.add(self._batch_web3.eth.get_block(block_num, full_transactions=True))
+            return batch.execute()
+
+    def iter_blocks(self, start_block, end_block):
+        """
+        以JSON-RPC批量請求逐塊產出 [start_block, end_block] 的區塊
+
+        逐塊的 get_block 是每塊一次HTTP往返, start_offset=10000 的
+        回補要付上萬次往返; 批量請求把 BATCH_RPC_SIZE 個調用打包進
+        一個HTTP POST, 往返次數減少約兩個數量級。
+        下一個批次在工作線程上預取, 網絡等待與區塊處理流水線重疊,
+        回補不再是"抓一批、停下處理、再抓一批"的串行節奏
+
+        參數:
+            start_block: 起始區塊號(含)
+            end_block: 結束區塊號(含)
+        """
+        chunks = [
+            (chunk_start, min(chunk_start + BATCH_RPC_SIZE - 1, end_block))
+            for chunk_start in range(start_block, end_block + 1, BATCH_RPC_SIZE)
+        ]
+        if not chunks:
+            return
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(self._fetch_block_chunk, *chunks[0])
+            for index in range(len(chunks)):
+                blocks = future.result()
+                # 處理當前批次前先把下一批的抓取排上工作線程
+                if index + 1 < len(chunks):
+                    future = pool.submit(self._fetch_block_chunk, *chunks[index + 1])
+                yield from blocks
 
+    async def _watch_new_heads(self, last_processed, processed_contracts):
+        """
+        通過 websocket 訂閱 newHeads, 新區塊一出塊即被推送過來
+
+        取代原來每隔幾秒輪詢 eth_blockNumber 的循環: 省掉每次
+        空轉的HTTP RPC, 檢測延遲也從半個輪詢間隔縮到接近零。
+        收到新頭後仍沿用同步的批量抓塊與區塊處理流程
+
+        參數:
+            last_processed: 已處理到的區塊號
+            processed_contracts: 已處理過的合約地址集合
+        """
+        async with AsyncWeb3(WebSocketProvider(self.ws_url)) as w3_ws:
+            await w3_ws.eth.subscribe("newHeads")
+            logging.info("Subscribed to newHeads via websocket")
+            async for payload in w3_ws.socket.process_subscriptions():
+                current_latest = payload["result"]["number"]
+                if current_latest > last_processed:
+                    logging.info(f"Processing blocks from {last_processed + 1} to {current_latest}")
+                    for block in self.iter_blocks(last_processed + 1, current_latest):
+                        self.process_block(block, processed_contracts)
+                    last_processed = current_latest
 
-    def monitor_blocks(self, start_offset=100, sleep_interval=5):
+    def monitor_blocks(self, start_offset=100):
         """
         持續監控以太坊區塊鏈上的新區塊
-        
+
         參數:
             start_offset: 起始點(當前區塊高度減去此值)
-            sleep_interval: 檢查新區塊的間隔時間(秒)
         """
         logging.info("Listening for new blocks...")
-        processed_contracts = set()  # Track already processed contract addresses
+        # 有界LRU形式的已處理合約集合 (插入順序即淘汰順序)
+        processed_contracts = OrderedDict()
 
         try:
             # Initial setup
@@ -145,24 +344,12 @@ class TokenScraper:
             start_block = max(0, initial_latest - start_offset)
             logging.info(f"Starting from block {start_block} up to {initial_latest}")
 
-            # Process historical blocks
-            for block_num in range(start_block, initial_latest + 1):
-                block = self.web3.eth.get_block(block_num, full_transactions=True)
+            # Process historical blocks in batched RPC requests
+            for block in self.iter_blocks(start_block, initial_latest):
                 self.process_block(block, processed_contracts)
 
-            # Now monitor new blocks
-            last_processed = initial_latest
-            while True:
-                current_latest = self.web3.eth.block_number
-                if current_latest > last_processed:
-                    logging.info(f"Processing blocks from {last_processed + 1} to {current_latest}")
-                    for block_num in range(last_processed + 1, current_latest + 1):
-                        block = self.web3.eth.get_block(block_num, full_transactions=True)
-                        self.process_block(block, processed_contracts)
-                    last_processed = current_latest
-                else:
-                    # No new blocks, sleep for a bit
-                    time.sleep(sleep_interval)
+            # Now monitor new blocks pushed over the websocket subscription
+            asyncio.run(self._watch_new_heads(initial_latest, processed_contracts))
 
         except KeyboardInterrupt:
             logging.info("\nStopped monitoring.")
@@ -179,7 +366,8 @@ class TokenScraper:
 
         # Run the scheduler
         while True:
-            self.monitor_blocks(start_offset=10000, sleep_interval=10) # ethereum each block is about 15 seconds
+            # websocket斷線或出錯後由外層循環重連重訂閱
+            self.monitor_blocks(start_offset=10000)
             
 
 
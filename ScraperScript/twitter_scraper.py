@@ -13,12 +13,15 @@
 # #######################################################################################
 
 import time
-import json
+import orjson
+import atexit
+from math import ceil
 import requests
+from requests.adapters import HTTPAdapter, Retry
 import sqlite3
-from datetime import datetime
+import threading
 from typing import Dict, Any, List, Optional
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from config import *
 import schedule
 import logging
@@ -26,6 +29,73 @@ import random
 from functools import partial
 import pandas as pd
 
+# 每個認證token的請求預算: 每15分鐘窗口50個請求
+TOKEN_BUCKET_CAPACITY = 50
+TOKEN_BUCKET_WINDOW = 900
+
+
+# 用戶可用性複查的TTL(秒)與每輪上限: 兩分鐘一輪的檢查只覆蓋
+# 超過一天沒查過的用戶, 不再每輪掃過全部用戶
+USER_CHECK_TTL = 86400
+USER_CHECK_BATCH_LIMIT = 100
+
+
+class TokenBucket:
+    """
+    線程安全的令牌桶限速器
+
+    桶裡有令牌時請求立即放行(允許突發), 桶空時阻塞到下一個令牌
+    按補充速率生成; 吞吐收斂到恰好貼著配額, 不靠保守的固定sleep
+    """
+
+    def __init__(self, capacity=TOKEN_BUCKET_CAPACITY,
+                 refill_rate=TOKEN_BUCKET_CAPACITY / TOKEN_BUCKET_WINDOW):
+        """
+        初始化令牌桶
+
+        參數:
+            capacity: 桶容量 (允許的最大突發請求數)
+            refill_rate: 每秒補充的令牌數
+        """
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        取得一個令牌, 桶空時阻塞到令牌可用
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.updated) * self.refill_rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.refill_rate
+            time.sleep(wait)
+
+
+def _timeline_entries(response_json: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """取出時間線響應中的entries列表 (分頁熱路徑共用的深層訪問)"""
+    return response_json['data']['user']['result']['timeline_v2']['timeline']['instructions'][-1]['entries']
+
+
+# entryId首段前綴 -> 推文結果提取器: entryId的前綴是穩定的
+# ("tweet-...", "profile-conversation-...", "who-to-follow-...",
+# "cursor-..."), partition一次取首段做O(1)字典分發, 取代對每條
+# entry的多次子串掃描; 未登記的前綴(who-to-follow/cursor等)落空跳過
+_TWEET_ENTRY_EXTRACTORS = {
+    "tweet": lambda entry:
+        entry['content']['itemContent']['tweet_results']['result'],
+    "profile": lambda entry:
+        entry['content']['items'][0]['item']['itemContent']['tweet_results']['result'],
+}
+
 
 class TweetDatabase:
     """
@@ -35,23 +105,85 @@ class TweetDatabase:
     包括存儲和檢索推文、用戶信息等
     """
     
+    # 每個連接都要重新下達的PRAGMA (journal_mode=WAL寫進數據庫文件,
+    # 只需設置一次; 其餘設定都是連接級的)
+    CONNECTION_PRAGMAS = (
+        "PRAGMA synchronous=NORMAL",     # WAL下已足夠安全, 減少每次提交的fsync
+        "PRAGMA temp_store=MEMORY",      # 臨時表/排序走內存
+        "PRAGMA cache_size=-65536",      # 64MB頁緩存
+        "PRAGMA mmap_size=268435456",    # 256MB內存映射讀取
+        "PRAGMA busy_timeout=5000",      # 寫鎖競爭時等待而非立刻報錯
+    )
+
     def __init__(self, db_path):
         """
         初始化 Twitter 數據庫連接
-        
+
         參數:
             db_path: SQLite 數據庫文件路徑
         """
         self.db_path = db_path
+        # WAL是持久設定: 讀推文列表的任務不再被寫推文的任務阻塞
+        bootstrap_conn = sqlite3.connect(self.db_path)
+        bootstrap_conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            # 反連接/JOIN按TwitterUser查找, 沒有索引就是每輪全表掃描
+            # (twitter_users.username本身是主鍵, 已有索引)
+            bootstrap_conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_tokens_twitter_user ON tokens(TwitterUser)"
+            )
+            # 遷移: 補上可用性複查的時間戳列 (舊庫沒有)
+            columns = [row[1] for row in bootstrap_conn.execute(
+                "PRAGMA table_info(twitter_users)")]
+            if columns and "last_checked" not in columns:
+                bootstrap_conn.execute(
+                    "ALTER TABLE twitter_users ADD COLUMN last_checked INTEGER")
+            # 提及關係的規範化表: 下游"哪些推文提到了X"的分析直接走
+            # 索引查詢, 不必逐行重新解析tweet_mention_list的JSON;
+            # 行小且按複合主鍵訪問, WITHOUT ROWID省掉一層rowid間接
+            bootstrap_conn.execute("""
+                CREATE TABLE IF NOT EXISTS tweet_mentions (
+                    tweet_id TEXT,                -- 推文ID (對應tweets.tweet_id)
+                    screen_name TEXT,             -- 被提及用戶的用戶名
+                    name TEXT,                    -- 被提及用戶的顯示名
+                    PRIMARY KEY (tweet_id, screen_name)
+                ) WITHOUT ROWID
+            """)
+            bootstrap_conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_mentions_screen ON tweet_mentions(screen_name)"
+            )
+            bootstrap_conn.commit()
+        except sqlite3.Error as e:
+            logging.info(f"Database error (create index): {e}")
+        bootstrap_conn.close()
+        # 每線程緩存一個連接: 分鐘級任務的小查詢不再每次付
+        # 連接建立+PRAGMA的開銷
+        self._local = threading.local()
+        atexit.register(self.close)
 
     def get_connection(self):
         """
-        建立並返回新的數據庫連接
-        
+        返回當前線程的緩存數據庫連接, 首次調用時建立
+
         返回:
             SQLite 數據庫連接對象
         """
-        return sqlite3.connect(self.db_path)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            for pragma in self.CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """
+        關閉當前線程的緩存連接(若存在)
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
 
     def update_tweets(self, user_id: str, tweets: List[Dict[str, Any]]):
         """
@@ -61,26 +193,51 @@ class TweetDatabase:
             user_id: Twitter 用戶ID
             tweets: 包含推文信息的字典列表
         """
+        if not tweets:
+            return
+        query = """
+        INSERT OR IGNORE INTO tweets (
+            user_id, tweet_id, tweet_full_text, tweet_favorite_count, tweet_view_count, tweet_quote_count,
+            tweet_reply_count, tweet_retweet_count, tweet_created_at, user_name, tweet_mention_list
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
         try:
             conn = self.get_connection()
-            cursor = conn.cursor()
-            query = """
-            INSERT OR IGNORE INTO tweets (
-                user_id, tweet_id, tweet_full_text, tweet_favorite_count, tweet_view_count, tweet_quote_count,
-                tweet_reply_count, tweet_retweet_count, tweet_created_at, user_name, tweet_mention_list
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """
-
-            for tweet in tweets:
-                #print('User Name: ', tweet["user_name"])
-                #print('Timestamp: ', tweet["tweet_created_at"])
-                #print('Tweet full text: ', tweet["tweet_full_text"])
-                #print('------------------------------------ \n')
-
-                cursor.execute(query, (user_id, tweet["tweet_id"], tweet["tweet_full_text"], tweet["tweet_favorite_count"],tweet["tweet_view_count"],tweet["tweet_quote_count"],tweet["tweet_reply_count"],tweet["tweet_retweet_count"],tweet["tweet_created_at"],tweet["user_name"],tweet["tweet_mention_list"]))
-                conn.commit()
-
-
+            # 定期重爬抓回來的大多是已入庫的推文: 先按tweet_id批量
+            # 查出已存在的ID, 只為真正的新推文構建參數元組與提及行,
+            # 不靠INSERT OR IGNORE默默吞掉整批重複的準備工作
+            placeholders = ",".join("?" * len(tweets))
+            existing = {
+                tweet_id for (tweet_id,) in conn.execute(
+                    f"SELECT tweet_id FROM tweets WHERE tweet_id IN ({placeholders})",
+                    [tweet["tweet_id"] for tweet in tweets])
+            }
+            new_tweets = [tweet for tweet in tweets
+                          if tweet["tweet_id"] not in existing]
+            if not new_tweets:
+                return
+            rows = [
+                (user_id, tweet["tweet_id"], tweet["tweet_full_text"], tweet["tweet_favorite_count"],
+                 tweet["tweet_view_count"], tweet["tweet_quote_count"], tweet["tweet_reply_count"],
+                 tweet["tweet_retweet_count"], tweet["tweet_created_at"], tweet["user_name"],
+                 tweet["tweet_mention_list"])
+                for tweet in new_tweets
+            ]
+            # 同步寫入規範化的提及表: 提及分析在SQL層按索引查詢,
+            # 不再依賴對JSON列的逐行解析
+            mention_rows = [
+                (tweet["tweet_id"], screen_name, name)
+                for tweet in new_tweets
+                for screen_name, name in orjson.loads(tweet["tweet_mention_list"]).items()
+            ]
+            # 單一事務內executemany: N條推文只付一次fsync,
+            # 而不是每條推文一次execute+commit
+            with conn:
+                conn.executemany(query, rows)
+                if mention_rows:
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO tweet_mentions (tweet_id, screen_name, name) VALUES (?, ?, ?)",
+                        mention_rows)
         except sqlite3.Error as e:
             logging.info(f"Database error (update_tweets): {e}")
 
@@ -96,20 +253,17 @@ class TweetDatabase:
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
-            # SQL query to fetch Twitter URLs from the tokens table that are NOT in the twitter_user table
+            # 反連接改寫成LEFT JOIN + IS NULL, 兩側都走索引;
+            # DISTINCT把去重下推到SQL層, 不再在Python裡繞一圈set
             query = """
-            SELECT t.TwitterUser 
+            SELECT DISTINCT t.TwitterUser
             FROM tokens t
-            WHERE t.TwitterUser IS NOT NULL 
-            AND NOT EXISTS (
-                SELECT 1 FROM twitter_users u WHERE u.username = t.TwitterUser
-            )
+            LEFT JOIN twitter_users u ON u.username = t.TwitterUser
+            WHERE t.TwitterUser IS NOT NULL
+              AND u.username IS NULL
             """
             cursor.execute(query)
-            twitter_user = cursor.fetchall()
-
-            # Extract and clean Twitter usernames
-            return list(set(twitter_user))
+            return cursor.fetchall()
         
         except sqlite3.Error as e:
             logging.info(f"Database error (get_twitter_users_from_db): {e}")
@@ -133,12 +287,17 @@ class TweetDatabase:
             conn = self.get_connection()
             cursor = conn.cursor()
            
-            query = "SELECT username FROM twitter_users WHERE available = 'True' AND user_id > 1000000000000000000" 
+            # username是主鍵, 結果天然唯一, 不需要再過一遍set;
+            # 只選TTL已過期的用戶且每輪封頂, 檢查壓力與用戶總數脫鉤
+            query = f"""
+            SELECT username FROM twitter_users
+            WHERE available = 'True' AND user_id > 1000000000000000000
+              AND (last_checked IS NULL
+                   OR last_checked < strftime('%s','now') - {USER_CHECK_TTL})
+            LIMIT {USER_CHECK_BATCH_LIMIT}
+            """
             cursor.execute(query)
-            twitter_user = cursor.fetchall()
-
-            # Extract and clean Twitter usernames
-            return list(set(twitter_user))
+            return cursor.fetchall()
         
         except sqlite3.Error as e:
             logging.info(f"Database error (get_available_twitter_users): {e}")
@@ -215,6 +374,97 @@ class TweetDatabase:
         except Exception as ex:
             logging.info(f"Unexpected error (save_unavailable_user_info): {ex}")
 
+    def save_user_infos(self, user_dicts: List[Dict[str, Any]]):
+        """
+        批量將用戶信息保存到數據庫 (單一事務)
+
+        參數:
+            user_dicts: 包含用戶信息的字典列表
+        """
+        if not user_dicts:
+            return
+        query = """
+        INSERT OR REPLACE INTO twitter_users (
+            user_id, username, created_time, description, available
+        ) VALUES (?, ?, ?, ?, ?)
+        """
+        rows = [
+            (user_dict.get("user_id"), user_dict.get("username"),
+             user_dict.get("created_time"), user_dict.get("description"), "True")
+            for user_dict in user_dicts
+        ]
+        try:
+            conn = self.get_connection()
+            # K個用戶一次executemany+一次fsync, 而不是K個事務
+            with conn:
+                conn.executemany(query, rows)
+        except sqlite3.Error as e:
+            logging.info(f"Database error (save_user_infos): {e}")
+
+    def save_unavailable_user_infos(self, usernames: List[str]):
+        """
+        批量將不可用用戶保存到數據庫 (單一事務)
+
+        參數:
+            usernames: 不可用的 Twitter 用戶名列表
+        """
+        if not usernames:
+            return
+        query = """
+        INSERT OR REPLACE INTO twitter_users (
+            user_id, username, created_time, description, available
+        ) VALUES (?, ?, ?, ?, ?)
+        """
+        rows = [(None, username, None, None, "False") for username in usernames]
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.executemany(query, rows)
+        except sqlite3.Error as e:
+            logging.info(f"Database error (save_unavailable_user_infos): {e}")
+
+    def update_unavailable_user_infos(self, usernames: List[str]):
+        """
+        批量將現有用戶標記為不可用 (單一事務)
+
+        參數:
+            usernames: 要標記為不可用的 Twitter 用戶名列表
+        """
+        if not usernames:
+            return
+        query = """
+        UPDATE twitter_users
+        SET available = 'False'
+        WHERE username = ?
+        """
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.executemany(query, [(username,) for username in usernames])
+        except sqlite3.Error as e:
+            logging.info(f"Database error (update_unavailable_user_infos): {e}")
+
+    def mark_users_checked(self, usernames: List[str]):
+        """
+        批量記錄一批用戶的複查時間戳 (單一事務)
+
+        參數:
+            usernames: 本輪已檢查過的 Twitter 用戶名列表
+        """
+        if not usernames:
+            return
+        query = """
+        UPDATE twitter_users
+        SET last_checked = strftime('%s','now')
+        WHERE username = ?
+        """
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.executemany(query, [(username,) for username in usernames])
+        except sqlite3.Error as e:
+            logging.info(f"Database error (mark_users_checked): {e}")
+
     def upadte_unavailable_user_info(self, username):
         """
         將用戶標記為不可用
@@ -223,19 +473,18 @@ class TweetDatabase:
             username: 要標記為不可用的 Twitter 用戶名
         """
 
-        query = f"""
+        # 參數綁定而非f-string拼接: 帶引號的用戶名不會破壞SQL,
+        # 語句文本恆定也讓預編譯語句緩存得以命中
+        query = """
         UPDATE twitter_users
         SET  available = 'False'
-        WHERE username = '{username}';
+        WHERE username = ?;
         """
         try:
-            logging.info(username , ": ", query)
-            # Execute the query with values from user_dict
+            logging.info(f"Marking user unavailable: {username}")
             conn = self.get_connection()
             cursor = conn.cursor()
-            cursor.execute(
-                query
-            )
+            cursor.execute(query, (username,))
             conn.commit()
 
         except sqlite3.Error as e:
@@ -243,12 +492,15 @@ class TweetDatabase:
         except Exception as ex:
             logging.info(f"Unexpected error (save_unavailable_user_info): {ex}")
 
-    def get_all_user_ids(self) -> List[Any]:
+    def get_all_user_ids(self):
         """
-        獲取所有需要收集推文的用戶ID
-        
+        逐個產出所有需要收集推文的用戶ID (生成器)
+
+        直接迭代游標而非fetchall: 不把整張用戶列表物化成
+        1元組列表, 調用方在SQLite還在產出尾部行時就能開始網絡抓取
+
         返回:
-            可用且有效的 Twitter 用戶ID列表
+            逐個產出可用且有效的 Twitter 用戶ID
         """
 
         # query = "SELECT user_id FROM twitter_users WHERE available = 'True' AND user_id > 1000000000000000000 "
@@ -262,15 +514,12 @@ class TweetDatabase:
             conn = self.get_connection()
             cursor = conn.cursor()
             cursor.execute(query)
-            user_ids = [row[0] for row in cursor.fetchall()]  # Extract the first column (user_id) from each row
-
-            return user_ids
+            for (user_id,) in cursor:
+                yield user_id
         except sqlite3.Error as e:
             logging.info(f"Database error (get_all_user_ids): {e}")
-            return []
         except Exception as ex:
             logging.info(f"Unexpected error (get_all_user_ids): {ex}")
-            return []
 
 
 
@@ -303,6 +552,29 @@ class TwitterScraper:
         self.tweet_fieldToggles = tweet_fieldToggles
         self.user_fieldToggles = user_fieldToggles
 
+        # 每組認證一個長駐Session: keep-alive連接池復用同一主機的
+        # TCP+TLS連接, 省去每次請求的握手; 429/5xx時指數退避重試。
+        # cookies/headers預載進Session, 請求時不再逐次傳入
+        self._sessions = {}
+        for auth_set in auth:
+            session = requests.Session()
+            session.cookies.update(auth_set[0])
+            session.headers.update(auth_set[1])
+            session.mount("https://", HTTPAdapter(
+                pool_connections=max(len(auth), 1),
+                pool_maxsize=8,
+                max_retries=Retry(
+                    total=3,
+                    backoff_factor=0.5,
+                    status_forcelist=[429, 500, 502, 503, 504]
+                )
+            ))
+            self._sessions[id(auth_set)] = session
+
+        # 每組認證一個令牌桶: 請求節奏由配額驅動,
+        # 取代散落在各循環裡的固定sleep
+        self._buckets = {id(auth_set): TokenBucket() for auth_set in auth}
+
         logging.basicConfig(
             filename=log_file,
             level=logging.INFO,
@@ -329,7 +601,7 @@ class TwitterScraper:
             "withV2Timeline": True
         }
         return {
-            'variables': json.dumps(variables),
+            'variables': orjson.dumps(variables).decode(),
             'features': self.get_tweet_features,
             'fieldToggles': self.tweet_fieldToggles,
         }
@@ -358,7 +630,7 @@ class TwitterScraper:
             "withV2Timeline": True
         }
         return {
-            'variables': json.dumps(variables),
+            'variables': orjson.dumps(variables).decode(),
             'features': self.get_tweet_features,
             'fieldToggles': self.tweet_fieldToggles,
         }
@@ -377,28 +649,34 @@ class TwitterScraper:
             "screen_name": screen_name,
         }
         return {
-            'variables': json.dumps(variables),
+            'variables': orjson.dumps(variables).decode(),
             'features': self.get_user_features,
             'fieldToggles': self.user_fieldToggles,
         }
     
-    def fetch(self, url:str, params: Dict[str, Any]) -> Dict[str, Any]:
+    def fetch(self, url:str, params: Dict[str, Any], auth_set: Optional[List[Any]] = None) -> Dict[str, Any]:
         """
         通過Twitter API獲取數據
-        
-        使用隨機選擇的認證信息發送請求以避免限制
-        
+
+        未指定認證信息時隨機選擇一組以避免限制; 並發爬取時由
+        調用方傳入固定的認證組, 讓每個工作線程黏著自己的token
+
         參數:
             url: API URL
             params: 請求參數
-            
+            auth_set: 指定使用的認證組 (cookies, headers), 可選
+
         返回:
             API響應的JSON數據
         """
         try:
 
-            auth_set = random.choice(self.auth)
-            response = requests.get(url, params=params, cookies=auth_set[0], headers=auth_set[1])
+            if auth_set is None:
+                auth_set = random.choice(self.auth)
+            # 先從該token的令牌桶取得配額再發請求
+            self._buckets[id(auth_set)].acquire()
+            session = self._sessions[id(auth_set)]
+            response = session.get(url, params=params, timeout=10)
             response.raise_for_status()
 
             return response.json()
@@ -408,31 +686,31 @@ class TwitterScraper:
             return {}
     
     
-    def get_user(self, screen_name: str, db: TweetDatabase) -> Optional[str]:
+    def get_user(self, screen_name: str, auth_set: Optional[List[Any]] = None):
         """
-        獲取Twitter用戶信息並存儲到數據庫
-        
+        獲取Twitter用戶信息 (只抓取解析, 不寫數據庫)
+
         參數:
             screen_name: Twitter用戶名
-            db: TweetDatabase實例
-            
+            auth_set: 指定使用的認證組, 可選
+
         返回:
-            成功時返回用戶ID,失敗時返回None
+            成功時返回用戶數據字典; 用戶確定不存在時返回False;
+            暫時性錯誤(網絡/解析失敗)時返回None
         """
         params = self.build_get_user_params(screen_name)
 
         try:
-            response_json = self.fetch(self.user_url, params)
-            
+            response_json = self.fetch(self.user_url, params, auth_set)
+
             # Extract user ID from the response
-            if response_json['data'] != {}: # Check if the response is not empty
-                
-                user_result = response_json['data']['user']['result']
+            if response_json.get('data') == {}:
+                return False
+            if response_json.get('data'):
 
+                user_result = response_json['data']['user']['result']
 
-                self.process_user_response(user_result, screen_name, db)
-            if response_json['data'] == {}:
-                db.save_unavailable_user_info(screen_name)
+                return self.process_user_response(user_result, screen_name)
 
         except requests.exceptions.RequestException as e:
             logging.info(f"HTTP request error (get_user): {e}")
@@ -440,77 +718,83 @@ class TwitterScraper:
             logging.info(f"Error parsing response (get_user): {e}")
 
         return None
-    
-    def check_user(self, screen_name: str, db: TweetDatabase) -> Optional[str]:
+
+    def check_user(self, screen_name: str, auth_set: Optional[List[Any]] = None) -> bool:
         """
         檢查Twitter用戶是否仍然可用
-        
+
         參數:
             screen_name: Twitter用戶名
-            db: TweetDatabase實例
+            auth_set: 指定使用的認證組, 可選
+
+        返回:
+            用戶仍可用(或無法確認)時返回True, 確定不可用時返回False
         """
         params = self.build_get_user_params(screen_name)
 
         try:
-            response_json = self.fetch(self.user_url, params)
-            
-            if response_json['data'] == {}:
-                db.upadte_unavailable_user_info(screen_name)
+            response_json = self.fetch(self.user_url, params, auth_set)
+
+            if response_json.get('data') == {}:
+                return False
 
         except requests.exceptions.RequestException as e:
             logging.info(f"HTTP request error (check_user): {e}")
         except KeyError as e:
             logging.info(f"Error parsing response (check_user): {e}")
 
+        return True
 
-    
-    def process_user_response(self, user_result: dict, username:str, db: TweetDatabase) -> Optional[Dict[str, Any]]:
+
+
+    def process_user_response(self, user_result: dict, username:str):
         """
-        處理用戶數據API響應並保存到數據庫
-        
+        解析用戶數據API響應
+
         參數:
             user_result: 用戶API響應
             username: Twitter用戶名
-            db: TweetDatabase實例
-            
+
         返回:
-            成功時返回用戶數據字典,失敗時返回None
+            成功時返回用戶數據字典; 用戶被封禁/不存在時返回False;
+            解析失敗時返回None
         """
         try:
             if "message" in user_result:
-                db.save_unavailable_user_info(username)
-                return None
+                return False
             else:
-                db.save_user_info({
+                return {
                     "user_id": user_result['rest_id'],
                     "username": username,
                     "created_time":  user_result['legacy']['created_at'],
                     "description": user_result['legacy']['description'],
-                })
-                                
+                }
+
         except KeyError as e:
             logging.info(f"Error parsing response (get_user): {e}")
+            return None
 
 
-    def get_latest_tweets(self, user_id: str, count: int = 30) -> List[Dict[str, Any]]:
+    def get_latest_tweets(self, user_id: str, count: int = 30, auth_set: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
         """
         獲取用戶最新的推文
-        
+
         參數:
             user_id: Twitter用戶ID
             count: 要獲取的推文數量
-            
+            auth_set: 指定使用的認證組, 可選
+
         返回:
             推文數據字典列表
         """
         params = self.build_get_tweets_params(user_id, count)
-        response_json = self.fetch(self.tweet_url, params)
+        response_json = self.fetch(self.tweet_url, params, auth_set)
 
         try:
             if response_json == {}:
                 logging.info(f"No tweets found for user ID: {user_id}")
-                return [] 
-            response_entries = response_json['data']['user']['result']['timeline_v2']['timeline']['instructions'][-1]['entries']
+                return []
+            response_entries = _timeline_entries(response_json)
 
             return self.process_tweet_response(response_entries)
         except (KeyError, IndexError) as e:
@@ -531,8 +815,7 @@ class TwitterScraper:
         返回:
             推文數據字典列表
         """
-        import math
-        round_count = math.ceil(max_results / 20)
+        round_count = ceil(max_results / 20)
 
         params = self.build_get_tweets_params(user_id, 30)
         response_json = self.fetch(self.tweet_url, params)
@@ -540,28 +823,38 @@ class TwitterScraper:
         try:
             if response_json == {}:
                 logging.info(f"No tweets found for user ID: {user_id}")
-                return [] 
-            response_entries = response_json['data']['user']['result']['timeline_v2']['timeline']['instructions'][-1]['entries']
+                return []
+            response_entries = _timeline_entries(response_json)
             cursor_value = response_entries[-1]['content']['value']
 
             tweets_list = self.process_tweet_response(response_entries)
 
+            # 變量字典與params只構建一次, 每頁只改cursor再重編碼變量:
+            # 省掉每頁重建兩個字典的開銷 (features/fieldToggles不變)
+            base_vars = {
+                "userId": user_id,
+                "count": 30,
+                "cursor": cursor_value,
+                "includePromotedContent": True,
+                "withQuickPromoteEligibilityTweetFields": True,
+                "withVoice": True,
+                "withV2Timeline": True
+            }
+            params = {
+                'variables': None,
+                'features': self.get_tweet_features,
+                'fieldToggles': self.tweet_fieldToggles,
+            }
+
             for _ in range(round_count - 1):
-                params = self.build_get_tweets_params_page_x(user_id, 30, cursor_value)
+                base_vars["cursor"] = cursor_value
+                params['variables'] = orjson.dumps(base_vars).decode()
                 response_json = self.fetch(self.tweet_url, params)
-                response_entries = response_json['data']['user']['result']['timeline_v2']['timeline']['instructions'][-1]['entries']
+                response_entries = _timeline_entries(response_json)
                 if len(response_entries) < 5:
                     break
                 cursor_value = response_entries[-1]['content']['value']
-                for i  in self.process_tweet_response(response_entries):
-                    tweets_list.append(i)
-                
-                # each 5 round sleep 5 seconds
-                if _ % 5 == 0:
-                    time.sleep(5)
-
-                if _ % 10 == 0:
-                    time.sleep(60)
+                tweets_list.extend(self.process_tweet_response(response_entries))
 
             logging.info(f"Total tweets fetched for user ID {user_id}: {len(tweets_list)}")
             return tweets_list
@@ -572,133 +865,214 @@ class TwitterScraper:
             return []
     
 
-    def parse_tweet(self, tweet_id, tweet_results: dict) -> Optional[Dict[str, Any]]:
+    def _serialize_mentions(self, user_mentions: Any) -> str:
         """
-        解析單個推文數據
-        
-        從API響應中提取推文的關鍵信息
-        
+        把推文的提及列表序列化為 {用戶名: 顯示名} 的JSON字符串
+
         參數:
-            tweet_id: 推文ID
-            tweet_results: 推文API響應
-            
+            user_mentions: API響應中的user_mentions列表
+
         返回:
-            解析後的推文數據字典或None
+            JSON字符串 (無提及時為"{}")
         """
-        
-        try:
-            if tweet_results is None or 'legacy' not in tweet_results or 'core' not in tweet_results:
-                logging.info(f"Invalid tweet results for tweet ID : {tweet_id}")
-                return None
-            
-            tweet_content = tweet_results['legacy']
-            user_content = tweet_results['core']['user_results']['result']['legacy']
-
-            return {
-                "tweet_id": tweet_id,
-                "tweet_full_text": tweet_content['full_text'],
-                "tweet_favorite_count": tweet_content['favorite_count'],
-                "tweet_view_count": tweet_results.get('views', {}).get('count', 0),
-                "tweet_quote_count": tweet_content['quote_count'],
-                "tweet_reply_count": tweet_content['reply_count'],
-                "tweet_retweet_count": tweet_content['retweet_count'],
-                "tweet_created_at": datetime.strptime(tweet_content['created_at'], "%a %b %d %H:%M:%S %z %Y").isoformat(),
-                "user_name": user_content['name'],
-                "tweet_mention_list": json.dumps(
-                    {mention['screen_name']: mention['name'] for mention in tweet_content['entities']['user_mentions']},
-                    ensure_ascii=False
-                ),
-            }
-        except (KeyError, ValueError) as e:
-            logging.info(f"Error parsing tweet (parse_tweet): {e}")
-
-            logging.info('tweet_results : ', tweet_results)
-
-            return None
+        if not isinstance(user_mentions, list):
+            return "{}"
+        # orjson默認不轉義非ASCII, 等價ensure_ascii=False
+        return orjson.dumps(
+            {mention['screen_name']: mention['name'] for mention in user_mentions}
+        ).decode()
 
     def process_tweet_response(self, response_entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         處理API響應中的推文條目
-        
-        過濾並解析API響應中的推文數據
-        
+
+        結構分發(哪種entry)仍逐條進行, 字段提取改為列式:
+        所有推文一次json_normalize展平, 時間戳整列一次to_datetime
+        解析, 取代每條推文各自的字典索引與strptime
+
         參數:
             response_entries: API響應中的條目列表
-            
+
         返回:
             解析後的推文數據字典列表
         """
-        tweets = []
+        tweet_results = []
         for entry in response_entries:
             entry_id = entry.get('entryId', '')
-            if "who-to-follow" in entry_id:
-                continue  # Skip "who-to-follow" entries
-    
-            if 'profile-conversation' in entry['entryId']:
-                try:
-                    parsed_tweet = self.parse_tweet(entry_id, entry['content']['items'][0]['item']['itemContent']['tweet_results']['result']) 
-                except KeyError as e:
-                    logging.info(f"Error parsing tweet (profile-conversation): {e}")
-                    continue
-            if "tweet" in entry['entryId']:
-                # Extract tweet and user content
-                try:
-                    parsed_tweet = self.parse_tweet(entry_id, entry['content']['itemContent']['tweet_results']['result'])
-                except KeyError as e:
-                    logging.info(f"Error parsing tweet (tweet): {e}")
-                    continue
-            if parsed_tweet:
-                tweets.append(parsed_tweet)
-        return tweets
+            extractor = _TWEET_ENTRY_EXTRACTORS.get(entry_id.partition('-')[0])
+            if extractor is None:
+                continue  # who-to-follow / cursor 等非推文entry
+
+            try:
+                result = extractor(entry)
+            except (KeyError, IndexError) as e:
+                logging.info(f"Error parsing tweet ({entry_id}): {e}")
+                continue
+
+            if result is None or 'legacy' not in result or 'core' not in result:
+                logging.info(f"Invalid tweet results for tweet ID : {entry_id}")
+                continue
+            tweet_results.append((entry_id, result))
+
+        if not tweet_results:
+            return []
+
+        try:
+            df = pd.json_normalize([result for _, result in tweet_results])
+            parsed = pd.DataFrame({
+                "tweet_id": [entry_id for entry_id, _ in tweet_results],
+                "tweet_full_text": df["legacy.full_text"],
+                "tweet_favorite_count": df["legacy.favorite_count"],
+                "tweet_view_count": df["views.count"].fillna(0) if "views.count" in df else 0,
+                "tweet_quote_count": df["legacy.quote_count"],
+                "tweet_reply_count": df["legacy.reply_count"],
+                "tweet_retweet_count": df["legacy.retweet_count"],
+                "tweet_created_at": pd.to_datetime(
+                    df["legacy.created_at"], format="%a %b %d %H:%M:%S %z %Y"
+                ).map(lambda created_at: created_at.isoformat()),
+                "user_name": df["core.user_results.result.legacy.name"],
+                "tweet_mention_list": [
+                    self._serialize_mentions(user_mentions)
+                    for user_mentions in df.get("legacy.entities.user_mentions",
+                                                pd.Series([None] * len(df)))
+                ],
+            })
+            return parsed.to_dict("records")
+        except (KeyError, ValueError) as e:
+            logging.info(f"Error parsing tweets (process_tweet_response): {e}")
+            return []
     
+    def _shard_across_auth(self, items: List[Any]) -> List[Any]:
+        """
+        把一批任務按認證token數量分片
+
+        參數:
+            items: 要分片的列表
+
+        返回:
+            (auth_set, 分片) 元組列表 (空分片已剔除)
+        """
+        num_workers = max(len(self.auth), 1)
+        shards = [items[i::num_workers] for i in range(num_workers)]
+        return [
+            (auth_set, shard)
+            for auth_set, shard in zip(self.auth, shards)
+            if shard
+        ]
+
+    def _fetch_users_with_auth(self, auth_set: List[Any], usernames: List[str]) -> List[Any]:
+        """
+        以固定的認證token串行抓取一批用戶的信息
+
+        參數:
+            auth_set: 此工作線程使用的認證組
+            usernames: 分配給此線程的用戶名列表
+
+        返回:
+            (用戶名, get_user結果) 元組列表
+        """
+        results = []
+        for username in usernames:
+            logging.info(username)
+            results.append((username, self.get_user(username, auth_set)))
+        return results
+
     def update_new_twitter_users(self, db: TweetDatabase):
         """
         更新新發現的Twitter用戶信息
-        
-        獲取並保存數據庫中新發現的Twitter用戶
-        
+
+        網絡抓取與數據庫寫入分離: 各認證token並發抓取自己的分片,
+        結果彙總後分別以一次executemany批量寫入
+
         參數:
             db: TweetDatabase實例
         """
         try:
-            logging.info("Updating new Twitter users...")    
+            logging.info("Updating new Twitter users...")
             twitter_usernames = db.get_new_twitter_users_from_db()
 
 
             if twitter_usernames == []:
                 logging.info("No new Twitter users to update.")
-            else:
-                for username in twitter_usernames:
-                    logging.info(username[0])
-                    self.get_user(username[0], db)
-                    time.sleep(5)
-            
+                return
+
+            usernames = [username[0] for username in twitter_usernames]
+            good_rows = []
+            bad_names = []
+            with ThreadPoolExecutor(max_workers=max(len(self.auth), 1)) as executor:
+                futures = [
+                    executor.submit(self._fetch_users_with_auth, auth_set, shard)
+                    for auth_set, shard in self._shard_across_auth(usernames)
+                ]
+                for future in as_completed(futures):
+                    for username, user in future.result():
+                        if user:
+                            good_rows.append(user)
+                        elif user is False:
+                            # False表示用戶確定不存在; None是暫時性
+                            # 錯誤, 留到下一輪重試
+                            bad_names.append(username)
+
+            db.save_user_infos(good_rows)
+            db.save_unavailable_user_infos(bad_names)
 
-            
         except KeyboardInterrupt:
             logging.info("Updating new Twitter users interrupted by user.")
 
+    def _check_users_with_auth(self, auth_set: List[Any], usernames: List[str]) -> List[str]:
+        """
+        以固定的認證token串行檢查一批用戶的可用性
+
+        參數:
+            auth_set: 此工作線程使用的認證組
+            usernames: 分配給此線程的用戶名列表
+
+        返回:
+            (已檢查的用戶名列表, 確定已不可用的用戶名列表) 元組
+        """
+        checked = []
+        gone = []
+        for username in usernames:
+            logging.info(username)
+            if not self.check_user(username, auth_set):
+                gone.append(username)
+            checked.append(username)
+        return checked, gone
+
     def check_twitter_users(self, db: TweetDatabase):
         """
         檢查現有Twitter用戶的可用性
-        
-        驗證已知用戶是否仍然可訪問
-        
+
+        驗證已知用戶是否仍然可訪問, 失效的用戶批量標記為不可用
+
         參數:
             db: TweetDatabase實例
         """
         try:
-            logging.info("Checking users...")    
+            logging.info("Checking users...")
             twitter_usernames = db.get_available_twitter_users()
 
             if twitter_usernames == []:
                 logging.info("No new Twitter users to update.")
-            else:
-                for username in twitter_usernames:
-                    logging.info(username[0])
-                    self.check_user(username[0], db)
-                    time.sleep(5)
-            
+                return
+
+            usernames = [username[0] for username in twitter_usernames]
+            checked_names = []
+            gone_names = []
+            with ThreadPoolExecutor(max_workers=max(len(self.auth), 1)) as executor:
+                futures = [
+                    executor.submit(self._check_users_with_auth, auth_set, shard)
+                    for auth_set, shard in self._shard_across_auth(usernames)
+                ]
+                for future in as_completed(futures):
+                    checked, gone = future.result()
+                    checked_names.extend(checked)
+                    gone_names.extend(gone)
+
+            db.update_unavailable_user_infos(gone_names)
+            # 記錄複查時間戳, TTL內不會再被選中
+            db.mark_users_checked(checked_names)
+
         except KeyboardInterrupt:
             logging.info("Updating new Twitter users interrupted by user.")
 
@@ -715,13 +1089,44 @@ class TwitterScraper:
         
 
         logging.info("Scraping tweets periodically...")
-        user_ids = db.get_all_user_ids()
-        for user_id in user_ids:
-            latest_tweets = self.get_latest_tweets(user_id, 30)
-            
+        # 生成器+共享迭代器: 第一個HTTP抓取在SQLite還在產出尾部行時
+        # 就已開始; 各工作線程按需領取下一個用戶(天然負載均衡),
+        # 每個線程仍黏著自己的token
+        user_ids_iter = iter(db.get_all_user_ids())
+        iter_lock = threading.Lock()
+
+        def next_user_id():
+            with iter_lock:
+                return next(user_ids_iter, None)
+
+        with ThreadPoolExecutor(max_workers=max(len(self.auth), 1)) as executor:
+            futures = [
+                executor.submit(self._scrape_users_with_auth, db, auth_set, next_user_id)
+                for auth_set in self.auth
+            ]
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.info(f"Error in tweet scraping worker: {e}")
+
+    def _scrape_users_with_auth(self, db: TweetDatabase, auth_set: List[Any], next_user_id):
+        """
+        以固定的認證token抓取用戶推文, 直到共享供給耗盡
+
+        參數:
+            db: TweetDatabase實例
+            auth_set: 此工作線程使用的認證組
+            next_user_id: 領取下一個用戶ID的可調用對象 (耗盡時返回None)
+        """
+        while True:
+            user_id = next_user_id()
+            if user_id is None:
+                break
+            latest_tweets = self.get_latest_tweets(user_id, 30, auth_set)
+
             db.update_tweets(user_id, latest_tweets)
             logging.info(f"Updating tweets for user ID: {user_id}")
-            time.sleep(5)
 
 
 
@@ -739,15 +1144,36 @@ class TwitterScraper:
         logging.info("Starting the scheduler...")
         logging.info("Scheduler started. Running tasks...")
 
+        def run_in_thread(job, lock):
+            """把任務丟進工作線程跑, 同一任務上一輪未結束時跳過本輪"""
+            def runner():
+                if not lock.acquire(blocking=False):
+                    return
+                try:
+                    job()
+                finally:
+                    lock.release()
+            threading.Thread(target=runner, daemon=True).start()
+
+        # 三個任務各自一把鎖: 任務之間並行(長的推文抓取不再擋住
+        # 每分鐘的新用戶更新), 任務自身不會與上一輪重疊
+        update_lock = threading.Lock()
+        check_lock = threading.Lock()
+        scrape_lock = threading.Lock()
+
         # Schedule tasks
-        schedule.every(1).minutes.do(lambda: self.update_new_twitter_users(db))
-        schedule.every(2).minutes.do(lambda: self.check_twitter_users(db))
-        schedule.every(5).minutes.do(lambda: self.scrape_tweets_periodically(db))
-        
+        schedule.every(1).minutes.do(
+            run_in_thread, lambda: self.update_new_twitter_users(db), update_lock)
+        schedule.every(2).minutes.do(
+            run_in_thread, lambda: self.check_twitter_users(db), check_lock)
+        schedule.every(5).minutes.do(
+            run_in_thread, lambda: self.scrape_tweets_periodically(db), scrape_lock)
+
         # Run the scheduler loop
         while True:
             schedule.run_pending()
-            time.sleep(1)  # Prevent busy-waiting
+            # 睡到下一個任務的到期時刻 (封頂30秒), 不再每秒空轉
+            time.sleep(max(min(schedule.idle_seconds() or 1, 30), 0))
 
 
 def main():